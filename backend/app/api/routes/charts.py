@@ -1,18 +1,29 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Dict, List, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Dict, Any, List, Optional
+from app.api.streaming import SSE_HEADERS, format_sse
+from app.database.session import AsyncSessionLocal, get_async_db
+from app.services.chart_service import ChartSpec, chart_service
+from app.services.downsampling import METHOD_LTTB
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Most charts in one /generate-batch request
+MAX_BATCH_CHARTS = 20
+
 
 # Pydantic schemas
 class ChartGenerateRequest(BaseModel):
     data_type: str  # e.g., "accounts", "portfolio", "performance"
     filters: Dict[str, Any]
     chart_type: str  # bar, line, pie, doughnut
+    max_points: Optional[int] = None  # Most points in a time series (capped by CHART_MAX_POINTS)
+    downsample: str = METHOD_LTTB  # lttb or minmax
 
 
 class ChartDataResponse(BaseModel):
@@ -21,160 +32,84 @@ class ChartDataResponse(BaseModel):
     options: Optional[Dict[str, Any]] = None
 
 
+class ChartBatchRequest(BaseModel):
+    charts: List[ChartGenerateRequest] = Field(..., min_length=1, max_length=MAX_BATCH_CHARTS)
+    stream: bool = False  # Send each chart as a Server-Sent Event as soon as it is built
+
+
+class ChartBatchResponse(BaseModel):
+    charts: List[ChartDataResponse]
+
+
+def _parse_spec(request: ChartGenerateRequest) -> ChartSpec:
+    return ChartSpec.parse(
+        request.data_type, request.chart_type, request.filters, request.max_points, request.downsample
+    )
+
+
 @router.post("/generate", response_model=ChartDataResponse)
-async def generate_chart(request: ChartGenerateRequest):
+async def generate_chart(
+    request: ChartGenerateRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Generate chart data based on request parameters
+
+    filters must include advisor_id and may include customer_id(s),
+    account_type(s), start_date/end_date (YYYY-MM or YYYY-MM-DD), months
+    (performance window, default 6), and group_by ("account_type" or
+    "customer") with limit for account charts. Time series longer than
+    max_points are downsampled with LTTB or min/max buckets.
     """
     try:
-        # TODO: Implement actual data fetching and processing
-        # For now, return sample data based on chart type
-
-        if request.data_type == "accounts":
-            return _generate_account_chart(request.chart_type, request.filters)
-        elif request.data_type == "portfolio":
-            return _generate_portfolio_chart(request.chart_type, request.filters)
-        elif request.data_type == "performance":
-            return _generate_performance_chart(request.chart_type, request.filters)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid data_type")
-
-    except HTTPException:
-        raise
+        return await chart_service.generate(db, _parse_spec(request))
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in generate_chart: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _generate_account_chart(chart_type: str, filters: dict) -> ChartDataResponse:
-    """Generate account balance chart"""
-
-    # Sample data - replace with actual database query
-    data = {
-        "labels": ["Checking", "Savings", "Investment", "Retirement"],
-        "datasets": [{
-            "label": "Account Balances",
-            "data": [12500, 45000, 125000, 350000],
-            "backgroundColor": [
-                "rgba(54, 162, 235, 0.6)",
-                "rgba(75, 192, 192, 0.6)",
-                "rgba(255, 206, 86, 0.6)",
-                "rgba(153, 102, 255, 0.6)"
-            ],
-            "borderColor": [
-                "rgba(54, 162, 235, 1)",
-                "rgba(75, 192, 192, 1)",
-                "rgba(255, 206, 86, 1)",
-                "rgba(153, 102, 255, 1)"
-            ],
-            "borderWidth": 1
-        }]
-    }
-
-    options = {
-        "responsive": True,
-        "plugins": {
-            "title": {
-                "display": True,
-                "text": "Account Balances by Type"
-            },
-            "legend": {
-                "display": True if chart_type in ["pie", "doughnut"] else False
-            }
-        },
-        "scales": {
-            "y": {
-                "beginAtZero": True,
-                "ticks": {
-                    "callback": "function(value) { return '$' + value.toLocaleString(); }"
-                }
-            }
-        } if chart_type in ["bar", "line"] else {}
-    }
-
-    return ChartDataResponse(
-        chartType=chart_type,
-        data=data,
-        options=options
-    )
+@router.post("/generate-batch", response_model=ChartBatchResponse)
+async def generate_chart_batch(request: ChartBatchRequest):
+    """
+    Generate several charts in one request
 
+    Charts with the same advisor, customer and account type filters are
+    built from one shared query. With stream, each chart is sent as a
+    Server-Sent Event ("chart" with its index) as soon as it is built,
+    followed by "done"; otherwise all charts are returned in request order.
+    """
+    specs = []
+    for index, chart in enumerate(request.charts):
+        try:
+            specs.append(_parse_spec(chart))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"charts[{index}]: {e}")
 
-def _generate_portfolio_chart(chart_type: str, filters: dict) -> ChartDataResponse:
-    """Generate portfolio allocation chart"""
-
-    data = {
-        "labels": ["Stocks", "Bonds", "Cash", "Real Estate"],
-        "datasets": [{
-            "label": "Portfolio Allocation",
-            "data": [45, 30, 15, 10],
-            "backgroundColor": [
-                "rgba(255, 99, 132, 0.6)",
-                "rgba(54, 162, 235, 0.6)",
-                "rgba(255, 206, 86, 0.6)",
-                "rgba(75, 192, 192, 0.6)"
-            ]
-        }]
-    }
-
-    options = {
-        "responsive": True,
-        "plugins": {
-            "title": {
-                "display": True,
-                "text": "Portfolio Allocation (%)"
-            },
-            "legend": {
-                "display": True,
-                "position": "right"
-            }
-        }
-    }
-
-    return ChartDataResponse(
-        chartType=chart_type,
-        data=data,
-        options=options
-    )
+    if request.stream:
+        return StreamingResponse(_stream_batch(specs), media_type="text/event-stream", headers=SSE_HEADERS)
 
+    try:
+        charts: List[Optional[dict]] = [None] * len(specs)
+        async with AsyncSessionLocal() as db:
+            async for index, chart in chart_service.generate_batch(db, specs):
+                charts[index] = chart
+        return {"charts": charts}
+
+    except Exception as e:
+        logger.error(f"Error in generate_chart_batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-def _generate_performance_chart(chart_type: str, filters: dict) -> ChartDataResponse:
-    """Generate performance over time chart"""
-
-    data = {
-        "labels": ["Jan", "Feb", "Mar", "Apr", "May", "Jun"],
-        "datasets": [{
-            "label": "Portfolio Value",
-            "data": [450000, 465000, 455000, 480000, 490000, 510000],
-            "fill": False,
-            "borderColor": "rgba(75, 192, 192, 1)",
-            "tension": 0.1
-        }]
-    }
-
-    options = {
-        "responsive": True,
-        "plugins": {
-            "title": {
-                "display": True,
-                "text": "Portfolio Performance (6 Months)"
-            },
-            "legend": {
-                "display": True
-            }
-        },
-        "scales": {
-            "y": {
-                "beginAtZero": False,
-                "ticks": {
-                    "callback": "function(value) { return '$' + value.toLocaleString(); }"
-                }
-            }
-        }
-    }
-
-    return ChartDataResponse(
-        chartType=chart_type,
-        data=data,
-        options=options
-    )
 
+async def _stream_batch(specs: List[ChartSpec]) -> AsyncIterator[str]:
+    """Server-Sent Events for a streamed batch; the session lives as long as the stream"""
+    try:
+        async with AsyncSessionLocal() as db:
+            async for index, chart in chart_service.generate_batch(db, specs):
+                yield format_sse({"event": "chart", "index": index, **chart})
+        yield format_sse({"event": "done", "count": len(specs)})
+    except Exception as e:
+        logger.error(f"Error in generate_chart_batch stream: {e}")
+        yield format_sse({"event": "error", "detail": str(e)})
@@ -1,16 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional
-from app.database.session import get_db
-from app.services.chat_service import chat_service
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ValidationError
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Optional
+from app.api.pagination import decode_cursor, encode_cursor, parse_fields
+from app.api.streaming import SSE_HEADERS, encode_event, format_sse
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal, get_async_db
+from app.models.chat import MESSAGE_STATUS_ABANDONED, ChatSession
+from app.services.chat_service import async_chat_service
 from app.services.langchain_service import langchain_service
+from app.services.llm_scheduler import SchedulerRejectedError
+from app.services.message_writer import MessageQueueFullError, message_writer
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Non-standard status (as used by nginx) for requests the client gave up on
+CLIENT_CLOSED_REQUEST = 499
+
 
 # Pydantic schemas
 class ChatMessageRequest(BaseModel):
@@ -25,6 +39,10 @@ class ChatMessageResponse(BaseModel):
     chart_data: Optional[dict] = None
 
 
+# Fields that can be requested from /history via fields=
+HISTORY_FIELDS = ("id", "role", "content", "chart_data", "status", "timestamp")
+
+
 class CreateSessionRequest(BaseModel):
     advisor_id: str
 
@@ -34,47 +52,156 @@ class CreateSessionResponse(BaseModel):
     advisor_id: str
 
 
+async def _get_or_create_session(db: AsyncSession, request: ChatMessageRequest) -> ChatSession:
+    """Get the requested chat session, creating a new one if it does not exist"""
+    session = None
+    if request.session_id:
+        session = await async_chat_service.get_session(db, request.session_id, request.advisor_id)
+
+    if not session:
+        # Create new session if none exists
+        session = await async_chat_service.create_session(db, request.advisor_id)
+
+    return session
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its reply is ready"""
+
+
+async def _save_turn(session_pk: int, session_id: str, message: str, received_at: datetime, response: dict):
+    """
+    Persist a completed user/assistant turn in one transaction
+
+    If the turn cannot be written it is also dropped from the agent's
+    memory, so the pooled session never remembers a turn the stored
+    history lacks.
+    """
+    try:
+        await message_writer.add_messages([
+            {"session_id": session_pk, "role": "user", "content": message, "timestamp": received_at},
+            {
+                "session_id": session_pk,
+                "role": "assistant",
+                "content": response["response"],
+                "chart_data": response.get("chart_data"),
+            },
+        ])
+    except Exception:
+        langchain_service.forget_turn(session_id, received_at)
+        raise
+
+
+def _save_abandoned_turn(session_pk: int, message: str, received_at: datetime):
+    """Record a user message that got no reply; safe to call while being cancelled"""
+    message_writer.add_message_nowait(
+        session_id=session_pk,
+        role="user",
+        content=message,
+        timestamp=received_at,
+        status=MESSAGE_STATUS_ABANDONED
+    )
+
+
+async def _cancel_on_disconnect(http_request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Await work, cancelling it if the client disconnects first
+
+    Cancellation reaches the agent's ainvoke and closes the HTTP stream to
+    Ollama. Raises ClientDisconnected in that case.
+    """
+    task = asyncio.ensure_future(work)
+    poll_interval = settings.CHAT_DISCONNECT_POLL_MS / 1000
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _stream_reply(request: ChatMessageRequest) -> AsyncIterator[dict]:
+    """
+    Stream agent events and persist the turn once the reply is complete
+
+    If the stream is closed or cancelled before the reply is done (client
+    disconnect), the agent run is cancelled and the user message is recorded
+    as abandoned.
+    """
+    received_at = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        session = await _get_or_create_session(db, request)
+        session_pk, session_id = session.id, session.session_id
+
+    yield {"event": "session", "session_id": session_id}
+
+    completed = False
+    try:
+        async with aclosing(langchain_service.stream_chat(
+            message=request.message,
+            advisor_id=request.advisor_id,
+            session_id=session_id,
+            received_at=received_at
+        )) as events:
+            async for event in events:
+                if event["event"] == "done":
+                    # The turn is saved as one batch from here on, even if the
+                    # client leaves while we wait for the commit
+                    completed = True
+                    try:
+                        await _save_turn(session_pk, session_id, request.message, received_at, event)
+                    except Exception:
+                        completed = False
+                        raise
+                    event = {**event, "session_id": session_id}
+                yield event
+    finally:
+        if not completed:
+            _save_abandoned_turn(session_pk, request.message, received_at)
+
+
+def _rejection_event(error: SchedulerRejectedError) -> dict:
+    """Error event telling a streaming client when to retry"""
+    return {
+        "event": "error",
+        "detail": str(error),
+        "status_code": error.status_code,
+        "retry_after": error.retry_after,
+    }
+
+
 @router.post("/message", response_model=ChatMessageResponse)
 async def send_message(
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Send a chat message and get AI response
+
+    If the client disconnects while the reply is being generated, generation
+    is cancelled and the user message is recorded as abandoned.
     """
+    received_at = datetime.utcnow()
+    session = None
     try:
         # Get or create session
-        session = None
-        if request.session_id:
-            session = chat_service.get_session(db, request.session_id, request.advisor_id)
-
-        if not session:
-            # Create new session if none exists
-            session = chat_service.create_session(db, request.advisor_id)
-
-        # Save user message
-        chat_service.add_message(
-            db=db,
-            session_id=session.id,
-            role="user",
-            content=request.message
-        )
+        session = await _get_or_create_session(db, request)
 
-        # Get AI response using LangChain
-        ai_response = await langchain_service.chat(
+        # Get AI response using LangChain, unless the client leaves first
+        ai_response = await _cancel_on_disconnect(http_request, langchain_service.chat(
             message=request.message,
             advisor_id=request.advisor_id,
-            session_id=session.session_id
-        )
+            session_id=session.session_id,
+            received_at=received_at
+        ))
 
-        # Save assistant message
-        chat_service.add_message(
-            db=db,
-            session_id=session.id,
-            role="assistant",
-            content=ai_response["response"],
-            chart_data=ai_response.get("chart_data")
-        )
+        # Save the user message and the reply
+        await _save_turn(session.id, session.session_id, request.message, received_at, ai_response)
 
         return ChatMessageResponse(
             response=ai_response["response"],
@@ -82,21 +209,144 @@ async def send_message(
             chart_data=ai_response.get("chart_data")
         )
 
+    except ClientDisconnected:
+        logger.info(f"Client disconnected, cancelled reply for session {session.session_id}")
+        _save_abandoned_turn(session.id, request.message, received_at)
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except MessageQueueFullError as e:
+        logger.warning(f"Rejecting message, write queue full: {e}")
+        _save_abandoned_turn(session.id, request.message, received_at)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except SchedulerRejectedError as e:
+        _save_abandoned_turn(session.id, request.message, received_at)
+        raise HTTPException(status_code=e.status_code, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Error in send_message: {e}")
+        if session is not None:
+            _save_abandoned_turn(session.id, request.message, received_at)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/message/stream")
+async def stream_message(request: ChatMessageRequest):
+    """
+    Send a chat message and stream the AI response as Server-Sent Events
+    """
+    async def event_stream():
+        try:
+            async for event in _stream_reply(request):
+                yield format_sse(event)
+        except SchedulerRejectedError as e:
+            yield format_sse(_rejection_event(e))
+        except Exception as e:
+            logger.error(f"Error in stream_message: {e}")
+            yield format_sse({"event": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+# Close code for a connection that dropped without a close frame
+WS_CLOSE_ABNORMAL = 1006
+
+
+async def _send_frame(websocket: WebSocket, event: dict):
+    """
+    Send one event to a WebSocket client
+
+    A send to a closed socket raises uvicorn's ClientDisconnected (an
+    OSError) rather than WebSocketDisconnect; both are raised as
+    WebSocketDisconnect so callers never answer a dead socket with an
+    error frame.
+    """
+    try:
+        await websocket.send_text(encode_event(event))
+    except OSError:
+        raise WebSocketDisconnect(code=WS_CLOSE_ABNORMAL)
+
+
+async def _read_frames(websocket: WebSocket, inbox: asyncio.Queue):
+    """Queue the client's message frames until it disconnects, then queue None"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            await inbox.put(message.get("text") or message.get("bytes"))
+    finally:
+        inbox.put_nowait(None)
+
+
+async def _send_reply(websocket: WebSocket, request: ChatMessageRequest):
+    """Stream the reply to one message; raises WebSocketDisconnect if a send fails"""
+    try:
+        # Closing the stream (also on cancellation) cancels the agent run
+        async with aclosing(_stream_reply(request)) as events:
+            async for event in events:
+                await _send_frame(websocket, event)
+    except WebSocketDisconnect:
+        raise
+    except SchedulerRejectedError as e:
+        await _send_frame(websocket, _rejection_event(e))
+    except Exception as e:
+        logger.error(f"Error in chat_websocket: {e}")
+        await _send_frame(websocket, {"event": "error", "detail": str(e)})
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over a WebSocket, streaming AI response events for each message
+
+    The socket is read for the whole connection, so a disconnect cancels
+    the reply in progress at once, even while it is waiting for an LLM slot
+    or running a tool and nothing is being sent. Messages sent during a
+    reply are answered after it.
+    """
+    await websocket.accept()
+    inbox: asyncio.Queue = asyncio.Queue()
+    reader = asyncio.create_task(_read_frames(websocket, inbox))
+    try:
+        while True:
+            frame = await inbox.get()
+            if frame is None:
+                break
+            try:
+                request = ChatMessageRequest(**json.loads(frame))
+            except (ValidationError, TypeError, ValueError) as e:
+                await _send_frame(websocket, {"event": "error", "detail": str(e)})
+                continue
+
+            reply = asyncio.create_task(_send_reply(websocket, request))
+            await asyncio.wait({reply, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if not reply.done():
+                # The client left mid-reply
+                reply.cancel()
+                await asyncio.wait({reply})
+                break
+            reply.result()
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+    logger.info("Chat WebSocket disconnected")
+
+
 @router.post("/session", response_model=CreateSessionResponse)
 async def create_session(
     request: CreateSessionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new chat session
     """
     try:
-        session = chat_service.create_session(db, request.advisor_id)
+        session = await async_chat_service.create_session(db, request.advisor_id)
 
         return CreateSessionResponse(
             session_id=session.session_id,
@@ -108,37 +358,87 @@ async def create_session(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stats")
+async def get_chat_stats():
+    """
+    LLM queue, circuit breaker, cache and conversation pool metrics
+    """
+    return {
+        "scheduler": langchain_service.scheduler.stats(),
+        "circuit": langchain_service.breaker.stats(),
+        "response_cache": langchain_service.cache.stats() if langchain_service.cache else None,
+        "book_context": langchain_service.book_contexts.stats() if langchain_service.book_contexts else None,
+        "customer_index": langchain_service.indexes.stats() if langchain_service.indexes else None,
+        "sessions": langchain_service.sessions.stats(),
+    }
+
+
 @router.get("/history/{session_id}")
 async def get_chat_history(
     session_id: str,
     advisor_id: str,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=settings.API_PAGE_SIZE_MAX,
+                                 description="Maximum number of messages to return (paginates the history)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated message fields to return "
+                                                    "(id and timestamp are always included)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get chat history for a session
+    Get chat history for a session, oldest first
+
+    Without limit or cursor the whole history is returned. Otherwise one
+    page is returned (API_PAGE_SIZE_DEFAULT if no limit is given), with
+    next_cursor set unless this is the last page.
     """
     try:
+        projection = parse_fields(fields, HISTORY_FIELDS)
+
+        after = None
+        if cursor:
+            values = decode_cursor(cursor)
+            try:
+                after = (datetime.fromisoformat(values["ts"]), int(values["id"]))
+            except (KeyError, TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            limit = limit or settings.API_PAGE_SIZE_DEFAULT
+
         # Get session with access check
-        session = chat_service.get_session(db, session_id, advisor_id)
+        session = await async_chat_service.get_session(db, session_id, advisor_id)
 
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
         # Get messages
-        messages = chat_service.get_session_messages(db, session.id)
+        messages, next_after = await async_chat_service.get_session_messages_page(
+            db, session.id, limit, after=after, fields=projection
+        )
 
-        return {
-            "session_id": session.session_id,
-            "messages": [
+        if projection:
+            items = [
+                {**msg, "timestamp": msg["timestamp"].isoformat()}
+                for msg in messages
+            ]
+        else:
+            items = [
                 {
                     "id": msg.id,
                     "role": msg.role,
                     "content": msg.content,
                     "chart_data": msg.chart_data,
+                    "status": msg.status,
                     "timestamp": msg.timestamp.isoformat()
                 }
                 for msg in messages
             ]
+
+        return {
+            "session_id": session.session_id,
+            "messages": items,
+            "next_cursor": encode_cursor({
+                "ts": next_after[0].isoformat(),
+                "id": next_after[1]
+            }) if next_after else None
         }
 
     except HTTPException:
@@ -146,4 +446,3 @@ async def get_chat_history(
     except Exception as e:
         logger.error(f"Error in get_chat_history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
-from app.database.session import get_db
-from app.services.customer_service import customer_service
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, parse_fields
+from app.core.config import settings
+from app.database.session import get_async_db
+from app.services.customer_service import async_customer_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -48,64 +51,181 @@ class CustomerDetailResponse(BaseModel):
 
 @router.get("", response_model=List[CustomerResponse])
 async def get_customers(
+    response: Response,
     advisor_id: str = Query(..., description="Advisor ID"),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=settings.API_PAGE_SIZE_MAX,
+                                 description="Maximum number of customers to return (paginates the list)"),
+    cursor: Optional[str] = Query(None, description=f"Cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get all customers for an advisor
+    Get customers for an advisor
+
+    Without limit or cursor every customer is returned. Otherwise one page
+    is returned (API_PAGE_SIZE_DEFAULT if no limit is given), with the
+    cursor for the next page in the X-Next-Cursor header, which is absent
+    on the last page.
     """
     try:
-        customers = customer_service.get_customers_by_advisor(db, advisor_id)
+        projection = parse_fields(fields, CustomerResponse.model_fields.keys())
+
+        after_id = None
+        if cursor:
+            try:
+                after_id = int(decode_cursor(cursor)["id"])
+            except (KeyError, TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            limit = limit or settings.API_PAGE_SIZE_DEFAULT
+
+        customers, next_id = await async_customer_service.get_customers_page(
+            db, advisor_id, limit, after_id=after_id, fields=projection
+        )
+
+        headers = {NEXT_CURSOR_HEADER: encode_cursor({"id": next_id})} if next_id is not None else {}
+        if projection:
+            return JSONResponse(content=customers, headers=headers)
+
+        response.headers.update(headers)
         return customers
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_customers: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Maximum number of customers returned by one /details call
+MAX_DETAIL_IDS = 100
+
+
+def _to_detail_response(customer) -> CustomerDetailResponse:
+    """Build a detail response from a customer with accounts loaded"""
+    return CustomerDetailResponse(
+        id=customer.id,
+        name=customer.name,
+        email=customer.email,
+        phone=customer.phone,
+        account_status=customer.account_status,
+        accounts=[
+            AccountResponse(
+                id=acc.id,
+                account_number=acc.account_number,
+                account_type=acc.account_type,
+                balance=acc.balance
+            )
+            for acc in customer.accounts
+        ],
+        total_balance=async_customer_service.total_balance(customer)
+    )
+
+
+@router.get("/details", response_model=List[CustomerDetailResponse])
+async def get_customer_details(
+    advisor_id: str = Query(..., description="Advisor ID"),
+    customer_ids: List[int] = Query(..., description="Customer IDs"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get detailed information for several customers in one call
+    """
+    try:
+        if len(customer_ids) > MAX_DETAIL_IDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_DETAIL_IDS} customer_ids may be requested at once"
+            )
+
+        customers = await async_customer_service.get_customer_details(db, customer_ids, advisor_id)
+        by_id = {customer.id: customer for customer in customers}
+
+        # Preserve the requested order; unknown or inaccessible IDs are omitted
+        return [
+            _to_detail_response(by_id[customer_id])
+            for customer_id in dict.fromkeys(customer_ids)
+            if customer_id in by_id
+        ]
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_customer_details: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class AccountTypeTotal(BaseModel):
+    account_type: str
+    balance: float
+    accounts: int
+
+
+class CustomerTotal(BaseModel):
+    id: int
+    name: str
+    total_balance: float
+
+
+class BookSummaryResponse(BaseModel):
+    total_balance: float
+    accounts: int
+    by_account_type: List[AccountTypeTotal]
+    top_customers: List[CustomerTotal]
+
+
+@router.get("/summary", response_model=BookSummaryResponse)
+async def get_book_summary(
+    advisor_id: str = Query(..., description="Advisor ID"),
+    top: int = Query(10, ge=1, le=100, description="Number of largest customers to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get an advisor's book totals, breakdown by account type and largest customers
+
+    Read from the maintained book aggregates, so the cost does not grow with
+    the size of the book.
+    """
+    try:
+        totals = await async_customer_service.get_book_totals(db, advisor_id)
+        top_customers = await async_customer_service.get_top_customer_totals(db, advisor_id, top)
+        return BookSummaryResponse(
+            total_balance=round(sum(balance for _, balance, _ in totals), 2),
+            accounts=sum(accounts for _, _, accounts in totals),
+            by_account_type=[
+                AccountTypeTotal(account_type=account_type, balance=round(balance, 2), accounts=accounts)
+                for account_type, balance, accounts in totals
+            ],
+            top_customers=[
+                CustomerTotal(id=customer_id, name=name, total_balance=round(balance, 2))
+                for customer_id, name, balance in top_customers
+            ],
+        )
+
+    except Exception as e:
+        logger.error(f"Error in get_book_summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{customer_id}", response_model=CustomerDetailResponse)
 async def get_customer(
     customer_id: int,
     advisor_id: str = Query(..., description="Advisor ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get detailed customer information including accounts
     """
     try:
-        # Get customer with access check
-        customer = customer_service.get_customer_by_id(db, customer_id, advisor_id)
+        # Get customer and accounts in one query, with access check
+        customer = await async_customer_service.get_customer_detail(db, customer_id, advisor_id)
 
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
 
-        # Get accounts
-        accounts = customer_service.get_customer_accounts(db, customer_id)
-
-        # Calculate total balance
-        total_balance = customer_service.get_total_balance(db, customer_id)
-
-        return CustomerDetailResponse(
-            id=customer.id,
-            name=customer.name,
-            email=customer.email,
-            phone=customer.phone,
-            account_status=customer.account_status,
-            accounts=[
-                AccountResponse(
-                    id=acc.id,
-                    account_number=acc.account_number,
-                    account_type=acc.account_type,
-                    balance=acc.balance
-                )
-                for acc in accounts
-            ],
-            total_balance=total_balance
-        )
+        return _to_detail_response(customer)
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in get_customer: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
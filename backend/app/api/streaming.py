@@ -0,0 +1,20 @@
+from app.core.metrics import STAGE_SERIALIZATION, record_stage
+import json
+import time
+
+# Headers for Server-Sent Events responses; stop proxies from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def encode_event(payload: dict) -> str:
+    """Encode a streamed event as JSON, timed as the serialization stage"""
+    started = time.perf_counter()
+    data = json.dumps(payload, default=str)
+    record_stage(STAGE_SERIALIZATION, time.perf_counter() - started)
+    return data
+
+
+def format_sse(event: dict) -> str:
+    """Format an event dict (with an "event" key naming it) as a Server-Sent Events frame"""
+    payload = {key: value for key, value in event.items() if key != "event"}
+    return f"event: {event['event']}\ndata: {encode_event(payload)}\n\n"
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional, Tuple
 import json
 
 
@@ -18,15 +18,107 @@ class Settings(BaseSettings):
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "mistral"
     OLLAMA_TEMPERATURE: float = 0.7
+    # Several Ollama servers to balance across; OLLAMA_BASE_URL is used when empty.
+    # Set from the environment as a JSON list, e.g. ["http://a:11434","http://b:11434"]
+    OLLAMA_BASE_URLS: List[str] = []
+    # Relative weight of each server in OLLAMA_BASE_URLS (default 1 each), also a JSON list
+    OLLAMA_BACKEND_WEIGHTS: List[float] = []
+    # "least_outstanding" or "weighted"
+    OLLAMA_ROUTING: str = "least_outstanding"
+    # Keep each chat session on one server while it is healthy
+    OLLAMA_SESSION_AFFINITY: bool = True
+    OLLAMA_EJECT_CONSECUTIVE_FAILURES: int = 3
+    OLLAMA_EJECT_ERROR_RATE: float = 0.5
+    OLLAMA_EJECT_SECONDS: int = 30
+
+    # Conversation state pool
+    LLM_SESSION_POOL_MAX_SESSIONS: int = 1000
+    LLM_SESSION_TTL_SECONDS: int = 1800
+    LLM_SESSION_MEMORY_BUDGET_BYTES: int = 64 * 1024 * 1024
+
+    # Compact summary of the advisor's customers and balances injected into the agent prompt
+    BOOK_CONTEXT_ENABLED: bool = True
+    BOOK_CONTEXT_MAX_CHARS: int = 4000
+    BOOK_CONTEXT_MAX_ADVISORS: int = 1000
+
+    # Advisors whose customer index (customers and accounts, for name lookups)
+    # is kept in memory between requests; 0 reloads it on every request
+    CUSTOMER_INDEX_CACHE_MAX_ADVISORS: int = 200
+
+    # Conversation history shown to the agent: the most recent turns within a
+    # token budget, plus a rolling summary of older turns
+    MEMORY_WINDOW_TURNS: int = 6
+    MEMORY_WINDOW_TOKENS: int = 1500
+    # Summarize once this many turns have left the window (in the background)
+    MEMORY_SUMMARY_MIN_TURNS: int = 4
+    # When off, turns that leave the window are dropped instead of summarized
+    MEMORY_SUMMARY_ENABLED: bool = True
+
+    # LLM scheduler: concurrent agent runs against Ollama and the queue in front of them
+    LLM_MAX_IN_FLIGHT: int = 2
+    LLM_QUEUE_MAX_SIZE: int = 100
+    LLM_QUEUE_MAX_PER_ADVISOR: int = 10
+    # Requests expected to wait longer than this are rejected with Retry-After
+    LLM_QUEUE_MAX_WAIT_MS: int = 30000
+
+    # Time budgets for LLM work: each generation, and each request's whole agent run
+    LLM_CALL_TIMEOUT_SECONDS: float = 30
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 60
+    # Fail fast for LLM_CIRCUIT_RESET_SECONDS after this many consecutive Ollama failures
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: int = 30
+
+    # How often /message checks whether the client is still connected
+    CHAT_DISCONNECT_POLL_MS: int = 250
+
+    # Per-route and per-stage latency histograms exported at /metrics
+    METRICS_ENABLED: bool = True
+
+    # /health/ready: reuse dependency check results for this long, and give each check this long
+    HEALTH_CACHE_SECONDS: float = 5
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 2
+    # Only ready while Ollama has the model in memory, not just installed
+    HEALTH_REQUIRE_MODEL_LOADED: bool = False
+
+    # Intent fast path: answer simple lookups without the ReAct agent
+    INTENT_FAST_PATH_ENABLED: bool = True
+    INTENT_FAST_PATH_MAX_WORDS: int = 25
+    # Use one short LLM call to phrase fast-path answers
+    INTENT_FAST_PATH_LLM_PHRASING: bool = False
+
+    # Response cache for agent answers, keyed by advisor, data version and prompt
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    # Optional SQLite file shared by all workers as a second cache tier
+    RESPONSE_CACHE_SQLITE_PATH: Optional[str] = None
+
+    # Most points in a chart time series; longer series are downsampled on the server
+    CHART_MAX_POINTS: int = 1000
 
     # Database
     DATABASE_URL: str = "sqlite:///./stifel.db"
+    # Async driver URL; derived from DATABASE_URL when not set
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Chat message write-behind queue
+    MESSAGE_WRITE_FLUSH_INTERVAL_MS: int = 20
+    MESSAGE_WRITE_BATCH_SIZE: int = 200
+    MESSAGE_WRITE_QUEUE_SIZE: int = 10000
+    MESSAGE_WRITE_ENQUEUE_TIMEOUT_MS: int = 1000
+    # "sync" waits for the batch commit; "async" returns once queued (may lose
+    # queued messages on a crash)
+    MESSAGE_WRITE_DURABILITY: str = "sync"
 
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Pagination for list endpoints
+    API_PAGE_SIZE_DEFAULT: int = 100
+    API_PAGE_SIZE_MAX: int = 500
+
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:3001"]
 
@@ -37,6 +129,12 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
+    def get_ollama_backends(self) -> List[Tuple[str, float]]:
+        """Ollama server URLs with their routing weights"""
+        urls = self.OLLAMA_BASE_URLS or [self.OLLAMA_BASE_URL]
+        weights = list(self.OLLAMA_BACKEND_WEIGHTS) + [1.0] * len(urls)
+        return [(url.rstrip("/"), float(weight)) for url, weight in zip(urls, weights)]
+
     def get_cors_origins(self) -> List[str]:
         """Parse CORS origins if stored as JSON string"""
         if isinstance(self.BACKEND_CORS_ORIGINS, str):
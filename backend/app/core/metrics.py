@@ -0,0 +1,390 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import JSONResponse
+import bisect
+import time
+
+# Prometheus text exposition format served by /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond DB queries to slow agent runs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage name -> seconds spent in it, for the HTTP request in progress
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one series per combination of label values"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets
+
+    observe() is a bisect and three additions; cumulative bucket counts are
+    only computed when the histogram is rendered.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> Iterator[str]:
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}"
+            suffix = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{suffix} {_format_value(total)}"
+            yield f"{self.name}_count{suffix} {count}"
+
+
+class CallbackMetric:
+    """
+    Metric whose samples are read from existing stats when rendered
+
+    collect returns (label values, value) pairs. Used for counters and gauges
+    that services already keep, so the request path pays nothing for them.
+    """
+
+    def __init__(self, name: str, documentation: str, type: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Sequence[str], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, tuple(labels))} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """Metrics exported at /metrics, in registration order"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, type: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Sequence[str], float]]]) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, type, labelnames, collect))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "advisor_http_request_duration_seconds",
+    "HTTP request latency by route template, until the last body byte is sent",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = registry.histogram(
+    "advisor_stage_duration_seconds",
+    "Time spent in each stage of request handling",
+    ("stage",),
+)
+LLM_TOKENS = registry.counter(
+    "advisor_llm_tokens_total",
+    "Tokens sent to (in) and generated by (out) Ollama",
+    ("direction",),
+)
+LLM_CALLS = registry.counter(
+    "advisor_llm_calls_total",
+    "LLM calls by outcome",
+    ("outcome",),
+)
+CHAT_ANSWERS = registry.counter(
+    "advisor_chat_answers_total",
+    "Chat answers by how they were produced: fast_path, cache, agent or degraded",
+    ("source",),
+)
+
+# Stage names recorded in STAGE_SECONDS
+STAGE_DB = "db"
+STAGE_QUEUE_WAIT = "queue_wait"
+STAGE_LLM_TTFT = "llm_ttft"
+STAGE_LLM = "llm"
+STAGE_TOOL = "tool"
+STAGE_AGENT_ITERATION = "agent_iteration"
+STAGE_SERIALIZATION = "serialization"
+
+
+def record_stage(name: str, seconds: float):
+    """Add time spent in a stage to its histogram and to the current request's total"""
+    STAGE_SECONDS.observe(seconds, name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as a stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def _server_timing(stages: Dict[str, float]) -> bytes:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()).encode()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per route and collecting stage timings
+
+    The route label is the matched path template (e.g. /api/v1/chat/history/{session_id})
+    so series stay bounded. Stage totals for the request are returned in a
+    Server-Timing header when they are known before the response starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stages: Dict[str, float] = {}
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if stages:
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", _server_timing(stages))]
+            await send(message)
+
+        token = _request_stages.set(stages)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records encoding the body as the serialization stage"""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        record_stage(STAGE_SERIALIZATION, time.perf_counter() - started)
+        return body
+
+
+def instrument_engine(engine: Engine):
+    """Record the time of every query run on a (sync) SQLAlchemy engine as the db stage"""
+
+    # The start time lives on the statement's execution context, so a
+    # statement that fails (and never reaches after_cursor_execute) leaves
+    # nothing behind on the pooled connection
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is not None:
+            record_stage(STAGE_DB, time.perf_counter() - started)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Record LLM time to first token, total time and token counts"""
+
+    # Called directly on the event loop instead of in a thread
+    run_inline = True
+
+    def __init__(self):
+        # run_id -> [started, first token seen, streamed tokens]
+        self._runs: Dict[UUID, list] = {}
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     **kwargs: Any) -> None:
+        self._runs[run_id] = [time.perf_counter(), False, 0]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        if not run[1]:
+            run[1] = True
+            record_stage(STAGE_LLM_TTFT, time.perf_counter() - run[0])
+        run[2] += 1
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        record_stage(STAGE_LLM, time.perf_counter() - run[0])
+        LLM_CALLS.inc("success")
+
+        # Ollama reports exact counts on its final chunk; fall back to streamed chunks
+        tokens_in, tokens_out = 0, run[2]
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                tokens_in += info.get("prompt_eval_count", 0)
+                tokens_out = info.get("eval_count", tokens_out)
+        LLM_TOKENS.inc("in", amount=tokens_in)
+        LLM_TOKENS.inc("out", amount=tokens_out)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            record_stage(STAGE_LLM, time.perf_counter() - run[0])
+            LLM_CALLS.inc("error")
+            LLM_TOKENS.inc("out", amount=run[2])
+
+
+class AgentMetricsHandler(BaseCallbackHandler):
+    """
+    Record tool execution time and agent iteration time
+
+    An iteration runs from the end of the previous one (or the start of the
+    agent run) to the end of its tool call, or to the final answer.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        # tool run_id -> started
+        self._tools: Dict[UUID, float] = {}
+        # agent run_id -> start of its current iteration
+        self._iterations: Dict[UUID, float] = {}
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        if parent_run_id is None:
+            self._iterations[run_id] = time.perf_counter()
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        self._iterations.pop(run_id, None)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._iterations.pop(run_id, None)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._tools[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                    **kwargs: Any) -> None:
+        now = time.perf_counter()
+        started = self._tools.pop(run_id, None)
+        if started is not None:
+            record_stage(STAGE_TOOL, now - started)
+        self._end_iteration(parent_run_id, now)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._tools.pop(run_id, None)
+        if started is not None:
+            record_stage(STAGE_TOOL, time.perf_counter() - started)
+
+    def on_agent_finish(self, finish, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_iteration(run_id, time.perf_counter())
+
+    def _end_iteration(self, agent_run_id: Optional[UUID], now: float):
+        started = self._iterations.get(agent_run_id)
+        if started is not None:
+            record_stage(STAGE_AGENT_ITERATION, now - started)
+            self._iterations[agent_run_id] = now
+
+
+llm_metrics = LLMMetricsHandler()
+agent_metrics = AgentMetricsHandler()
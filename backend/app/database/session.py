@@ -1,7 +1,21 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from typing import AsyncIterator
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Map a sync database URL to the equivalent async driver URL"""
+    if database_url.startswith("sqlite://"):
+        return database_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if database_url.startswith(prefix):
+            return database_url.replace(prefix, "postgresql+asyncpg://", 1)
+    return database_url
+
 
 # Create database engine
 engine = create_engine(
@@ -10,9 +24,28 @@ engine = create_engine(
     echo=settings.DEBUG,
 )
 
+# Create async database engine for use inside async route handlers
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL),
+    echo=settings.DEBUG,
+)
+
+# Time every query as the db stage of the request that ran it
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class; objects stay usable after commit without a reload
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -26,7 +59,24 @@ def get_db():
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
-    """Initialize database tables"""
+    """
+    Create missing tables and indexes
+
+    Columns added to existing tables come from the Alembic migrations
+    (alembic upgrade head), which are run once per deploy, not per process.
+    """
     Base.metadata.create_all(bind=engine)
 
+    # create_all skips tables that already exist, so add any indexes that were
+    # introduced after an existing database was created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.database.session import init_db
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, TimedJSONResponse, registry
+from app.database.session import async_engine, engine, init_db
+from app.api.pagination import NEXT_CURSOR_HEADER
 from app.api.routes import chat, customers, charts
+from app.models.book_aggregates import populate_book_aggregates
+from app.services.health import STATUS_UP, readiness_checker
+from app.services.langchain_service import langchain_service
+from app.services.message_writer import message_writer
 import logging
 
 # Configure logging
@@ -19,6 +25,7 @@ app = FastAPI(
     version=settings.APP_VERSION,
     description="AI-powered chat application for Stifel Financial Advisors",
     debug=settings.DEBUG,
+    default_response_class=TimedJSONResponse,
 )
 
 # Configure CORS
@@ -28,8 +35,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing"],
 )
 
+# Record per-route latency; added last so it also times CORS handling
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
+def _register_service_metrics():
+    """Export the counters and gauges services already keep, read when /metrics is scraped"""
+    scheduler = langchain_service.scheduler
+    registry.callback("advisor_llm_in_flight", "Agent runs currently talking to Ollama", "gauge", (),
+                      lambda: [((), scheduler.in_flight)])
+    registry.callback("advisor_llm_queue_depth", "Requests waiting for an LLM slot", "gauge", (),
+                      lambda: [((), scheduler.queue_depth)])
+    registry.callback("advisor_llm_queue_requests_total", "LLM scheduler admissions and rejections",
+                      "counter", ("result",),
+                      lambda: [(("admitted",), scheduler.admitted), (("rejected",), scheduler.rejected),
+                               (("timeout",), scheduler.timeouts)])
+
+    breaker = langchain_service.breaker
+    registry.callback("advisor_ollama_circuit_open", "1 while the Ollama circuit refuses calls", "gauge", (),
+                      lambda: [((), int(breaker.is_open))])
+    registry.callback("advisor_ollama_backend_up", "1 unless the Ollama server is ejected", "gauge", ("url",),
+                      lambda: [((b.url,), int(not b.ejected)) for b in langchain_service.pool.backends])
+    registry.callback("advisor_ollama_backend_outstanding", "Calls in progress per Ollama server", "gauge",
+                      ("url",),
+                      lambda: [((b.url,), b.outstanding) for b in langchain_service.pool.backends])
+
+    def cache_requests():
+        sessions = langchain_service.sessions
+        samples = [(("session", "hit"), sessions.hits), (("session", "miss"), sessions.misses)]
+        cache, book_contexts = langchain_service.cache, langchain_service.book_contexts
+        indexes = langchain_service.indexes
+        if cache is not None:
+            samples += [
+                (("response", "memory_hit"), cache.memory_hits),
+                (("response", "sqlite_hit"), cache.sqlite_hits),
+                (("response", "miss"), cache.misses),
+            ]
+        if book_contexts is not None:
+            samples += [
+                (("book_context", "hit"), book_contexts.hits),
+                (("book_context", "miss"), book_contexts.misses),
+            ]
+        if indexes is not None:
+            samples += [
+                (("customer_index", "hit"), indexes.hits),
+                (("customer_index", "miss"), indexes.misses),
+            ]
+        return samples
+
+    registry.callback("advisor_cache_requests_total", "Cache lookups by cache and result", "counter",
+                      ("cache", "result"), cache_requests)
+    registry.callback("advisor_chat_sessions", "Conversation states held in memory", "gauge", (),
+                      lambda: [((), len(langchain_service.sessions))])
+
+
+if settings.METRICS_ENABLED:
+    _register_service_metrics()
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -40,9 +106,16 @@ async def startup_event():
     # Initialize database
     init_db()
     logger.info("Database initialized")
+    with engine.begin() as connection:
+        if populate_book_aggregates(connection):
+            logger.info("Book aggregates built from existing accounts")
+
+    # Start batched chat message persistence
+    await message_writer.start()
 
     # Log Ollama configuration
-    logger.info(f"Ollama URL: {settings.OLLAMA_BASE_URL}")
+    for url, weight in settings.get_ollama_backends():
+        logger.info(f"Ollama URL: {url} (weight {weight:g})")
     logger.info(f"Ollama Model: {settings.OLLAMA_MODEL}")
 
 
@@ -51,6 +124,12 @@ async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info(f"Shutting down {settings.APP_NAME}")
 
+    # Flush queued chat messages before closing connections
+    await message_writer.stop()
+
+    # Close pooled async database connections
+    await async_engine.dispose()
+
 
 @app.get("/")
 async def root():
@@ -66,13 +145,42 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    readiness = await readiness_checker.check()
+    backends = langchain_service.pool.stats()
+    ollama_up = any(b["status"] == "healthy" for b in backends) and not langchain_service.breaker.is_open
     return {
-        "status": "healthy",
-        "database": "connected",
-        "ollama": settings.OLLAMA_BASE_URL,
+        "status": "healthy" if readiness["ready"] and ollama_up else "degraded",
+        "database": "connected" if readiness["database"]["status"] == STATUS_UP else "unavailable",
+        "ollama": backends,
+        "ollama_circuit": langchain_service.breaker.stats()["state"],
     }
 
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests; dependencies are not checked"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 while the database answers and an Ollama server has
+    the model, 503 otherwise, with the latency of each check
+
+    Results are cached for HEALTH_CACHE_SECONDS.
+    """
+    readiness = await readiness_checker.check()
+    return TimedJSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics"""
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 # Include routers
 app.include_router(
     chat.router,
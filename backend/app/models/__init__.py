@@ -3,6 +3,9 @@
 # Import all models here for easier access
 from app.models.customer import Customer, Account
 from app.models.chat import ChatSession, ChatMessage
+from app.models.balance_history import BalanceSnapshot
+from app.models.book_aggregates import AdvisorBookTotal, AdvisorDataVersion, CustomerBookTotal
 
-__all__ = ["Customer", "Account", "ChatSession", "ChatMessage"]
+__all__ = ["Customer", "Account", "ChatSession", "ChatMessage", "BalanceSnapshot",
+           "AdvisorBookTotal", "AdvisorDataVersion", "CustomerBookTotal"]
 
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Float, Date
+from app.database.session import Base
+
+
+def account_series(account_id: int) -> str:
+    return f"account:{account_id}"
+
+
+def customer_series(customer_id: int) -> str:
+    return f"customer:{customer_id}"
+
+
+def advisor_series(advisor_id: str, account_type: str = None) -> str:
+    """An advisor's whole book, or only the accounts of one type"""
+    return f"advisor:{advisor_id}:{account_type}" if account_type else f"advisor:{advisor_id}"
+
+
+class BalanceSnapshot(Base):
+    """
+    One day's closing balance of a series: an account, a customer's total,
+    or an advisor's total (overall and per account type)
+
+    The snapshot job writes one set of rows per day, replacing that day's
+    rows if it is re-run; seed_db.py can backfill history in bulk. Past
+    days are otherwise left alone. The primary key is (series, day) and, on
+    SQLite, the table is stored WITHOUT ROWID, so the rows of a series are
+    clustered by day and a date-range read is a single index range scan
+    that never touches another structure.
+    """
+    __tablename__ = "balance_snapshots"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    series = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    balance = Column(Float, nullable=False)
@@ -0,0 +1,254 @@
+from sqlalchemy import Column, Integer, String, Float, Index, delete, event, func, inspect, insert, literal, select, update
+from sqlalchemy.engine import Connection
+from app.database.session import Base
+from app.models.customer import Customer, Account
+from typing import Optional, Tuple
+
+# Account type recorded for accounts without one
+UNKNOWN_ACCOUNT_TYPE = "unknown"
+
+# state.info keys holding an account's row, or a customer's advisor, before an update or delete
+_PREVIOUS_ROW = "book_aggregates_previous_row"
+_PREVIOUS_ADVISOR = "book_aggregates_previous_advisor"
+
+
+class AdvisorBookTotal(Base):
+    """Total balance and number of an advisor's accounts of one type"""
+    __tablename__ = "advisor_book_totals"
+
+    advisor_id = Column(String, primary_key=True)
+    account_type = Column(String, primary_key=True)
+    balance = Column(Float, nullable=False, default=0.0)
+    accounts = Column(Integer, nullable=False, default=0)
+
+
+class CustomerBookTotal(Base):
+    """Total balance and number of accounts of a customer with at least one account"""
+    __tablename__ = "customer_book_totals"
+
+    customer_id = Column(Integer, primary_key=True)
+    advisor_id = Column(String)
+    balance = Column(Float, nullable=False, default=0.0)
+    accounts = Column(Integer, nullable=False, default=0)
+
+
+class AdvisorDataVersion(Base):
+    """Counter bumped by every ORM write to an advisor's customers or accounts"""
+    __tablename__ = "advisor_data_versions"
+
+    advisor_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# An advisor's top customers are the first entries of this index
+Index(
+    "ix_customer_book_totals_advisor_id_balance",
+    CustomerBookTotal.advisor_id, CustomerBookTotal.balance.desc(), CustomerBookTotal.customer_id,
+)
+
+
+# Account row as (customer_id, advisor_id, account_type, balance)
+AccountRow = Tuple[int, Optional[str], str, float]
+
+
+def _account_row(connection: Connection, account_id: int) -> Optional[AccountRow]:
+    """An account as stored in the database, with its customer's advisor"""
+    row = connection.execute(
+        select(Account.customer_id, Customer.advisor_id, Account.account_type, Account.balance)
+        .join(Customer, Account.customer_id == Customer.id)
+        .filter(Account.id == account_id)
+    ).first()
+    if row is None:
+        return None
+    return row[0], row[1], row[2] or UNKNOWN_ACCOUNT_TYPE, row[3] or 0.0
+
+
+def _add(connection: Connection, model, keys: dict, values: dict, balance: float, accounts: int):
+    """Add balance and accounts to an aggregate row, creating it if needed"""
+    filters = [getattr(model, name) == value for name, value in keys.items()]
+    result = connection.execute(
+        update(model).where(*filters).values(
+            balance=model.balance + balance, accounts=model.accounts + accounts, **values
+        )
+    )
+    if result.rowcount == 0 and accounts > 0:
+        connection.execute(insert(model).values(**keys, **values, balance=balance, accounts=accounts))
+    elif accounts < 0:
+        connection.execute(delete(model).where(*filters, model.accounts <= 0))
+
+
+def _apply(connection: Connection, row: AccountRow, sign: int):
+    """Add (sign 1) or remove (sign -1) one account's contribution to the aggregates"""
+    customer_id, advisor_id, account_type, balance = row
+    _add(connection, CustomerBookTotal, {"customer_id": customer_id}, {"advisor_id": advisor_id},
+         sign * balance, sign)
+    if advisor_id is not None:
+        _add(connection, AdvisorBookTotal, {"advisor_id": advisor_id, "account_type": account_type}, {},
+             sign * balance, sign)
+
+
+def bump_data_version(connection: Connection, advisor_id: str = None):
+    """Mark an advisor's book as changed, or every advisor's when advisor_id is None"""
+    if advisor_id is None:
+        connection.execute(update(AdvisorDataVersion).values(version=AdvisorDataVersion.version + 1))
+        connection.execute(insert(AdvisorDataVersion).from_select(
+            ["advisor_id", "version"],
+            select(Customer.advisor_id, literal(1)).distinct().filter(
+                Customer.advisor_id.is_not(None),
+                Customer.advisor_id.not_in(select(AdvisorDataVersion.advisor_id)),
+            ),
+        ))
+        return
+    result = connection.execute(
+        update(AdvisorDataVersion).where(AdvisorDataVersion.advisor_id == advisor_id)
+        .values(version=AdvisorDataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(AdvisorDataVersion).values(advisor_id=advisor_id, version=1))
+
+
+def _bump_advisors(connection: Connection, *advisor_ids: Optional[str]):
+    for advisor_id in {advisor_id for advisor_id in advisor_ids if advisor_id is not None}:
+        bump_data_version(connection, advisor_id)
+
+
+@event.listens_for(Account, "after_insert")
+def _account_inserted(mapper, connection, target):
+    row = _account_row(connection, target.id)
+    if row is not None:
+        _apply(connection, row, 1)
+        _bump_advisors(connection, row[1])
+
+
+@event.listens_for(Account, "before_update")
+@event.listens_for(Account, "before_delete")
+def _remember_account(mapper, connection, target):
+    # The old values are read from the database: attribute history does not
+    # have them when an expired attribute is overwritten without loading it
+    inspect(target).info[_PREVIOUS_ROW] = _account_row(connection, target.id)
+
+
+@event.listens_for(Account, "after_update")
+def _account_updated(mapper, connection, target):
+    previous = inspect(target).info.pop(_PREVIOUS_ROW, None)
+    current = _account_row(connection, target.id)
+    # Any column may have changed, even when the totals did not
+    _bump_advisors(connection, previous and previous[1], current and current[1])
+    if previous == current:
+        return
+    if previous is not None:
+        _apply(connection, previous, -1)
+    if current is not None:
+        _apply(connection, current, 1)
+
+
+@event.listens_for(Account, "after_delete")
+def _account_deleted(mapper, connection, target):
+    previous = inspect(target).info.pop(_PREVIOUS_ROW, None)
+    if previous is not None:
+        _apply(connection, previous, -1)
+        _bump_advisors(connection, previous[1])
+
+
+@event.listens_for(Customer, "after_insert")
+@event.listens_for(Customer, "after_delete")
+def _customer_changed(mapper, connection, target):
+    _bump_advisors(connection, target.advisor_id)
+
+
+@event.listens_for(Customer, "before_update")
+def _remember_advisor(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.advisor_id.history.has_changes():
+        state.info[_PREVIOUS_ADVISOR] = connection.execute(
+            select(Customer.advisor_id).filter(Customer.id == target.id)
+        ).scalar()
+
+
+@event.listens_for(Customer, "after_update")
+def _customer_updated(mapper, connection, target):
+    """Move a customer's accounts to their new advisor's totals"""
+    state = inspect(target)
+    advisor = target.advisor_id
+    if _PREVIOUS_ADVISOR not in state.info:
+        _bump_advisors(connection, advisor)
+        return
+    previous_advisor = state.info.pop(_PREVIOUS_ADVISOR)
+    _bump_advisors(connection, previous_advisor, advisor)
+    if previous_advisor == advisor:
+        return
+    account_type = func.coalesce(Account.account_type, UNKNOWN_ACCOUNT_TYPE)
+    rows = connection.execute(
+        select(account_type, func.sum(Account.balance), func.count(Account.id))
+        .filter(Account.customer_id == target.id)
+        .group_by(account_type)
+    ).all()
+    for type_name, balance, accounts in rows:
+        if previous_advisor is not None:
+            _add(connection, AdvisorBookTotal, {"advisor_id": previous_advisor, "account_type": type_name}, {},
+                 -(balance or 0.0), -accounts)
+        if advisor is not None:
+            _add(connection, AdvisorBookTotal, {"advisor_id": advisor, "account_type": type_name}, {},
+                 balance or 0.0, accounts)
+    connection.execute(
+        update(CustomerBookTotal).where(CustomerBookTotal.customer_id == target.id).values(advisor_id=advisor)
+    )
+
+
+def rebuild_book_aggregates(connection: Connection, advisor_id: str = None) -> Tuple[int, int]:
+    """
+    Recompute the aggregates from the accounts table, for one advisor or all
+
+    The events above only see writes made through the ORM; run this after
+    bulk inserts or raw SQL writes, or to repair drift. Also bumps the data
+    version of the advisors rebuilt so their cached answers are dropped.
+    Returns the number of (advisor, account type) and customer rows written.
+    """
+    customers = select(Customer.id)
+    advisor_totals = delete(AdvisorBookTotal)
+    customer_totals = delete(CustomerBookTotal)
+    if advisor_id is not None:
+        customers = customers.filter(Customer.advisor_id == advisor_id)
+        advisor_totals = advisor_totals.where(AdvisorBookTotal.advisor_id == advisor_id)
+        customer_totals = customer_totals.where(
+            (CustomerBookTotal.advisor_id == advisor_id) | CustomerBookTotal.customer_id.in_(customers)
+        )
+    connection.execute(advisor_totals)
+    connection.execute(customer_totals)
+
+    account_type = func.coalesce(Account.account_type, UNKNOWN_ACCOUNT_TYPE)
+    accounts = select().select_from(Account).join(Customer, Account.customer_id == Customer.id)
+    if advisor_id is not None:
+        accounts = accounts.filter(Customer.advisor_id == advisor_id)
+
+    by_type = connection.execute(insert(AdvisorBookTotal).from_select(
+        ["advisor_id", "account_type", "balance", "accounts"],
+        accounts.add_columns(Customer.advisor_id, account_type, func.coalesce(func.sum(Account.balance), 0.0),
+                             func.count(Account.id))
+        .filter(Customer.advisor_id.is_not(None))
+        .group_by(Customer.advisor_id, account_type),
+    ))
+    by_customer = connection.execute(insert(CustomerBookTotal).from_select(
+        ["customer_id", "advisor_id", "balance", "accounts"],
+        accounts.add_columns(Account.customer_id, Customer.advisor_id, func.coalesce(func.sum(Account.balance), 0.0),
+                             func.count(Account.id))
+        .group_by(Account.customer_id, Customer.advisor_id),
+    ))
+    bump_data_version(connection, advisor_id)
+    return by_type.rowcount, by_customer.rowcount
+
+
+def populate_book_aggregates(connection: Connection) -> bool:
+    """
+    Build the aggregates if they are empty while accounts exist, as on the
+    first start against a database created before they were introduced.
+    Returns whether they were built.
+    """
+    if connection.execute(select(AdvisorDataVersion.advisor_id).limit(1)).first() is None:
+        bump_data_version(connection)
+    if connection.execute(select(CustomerBookTotal.customer_id).limit(1)).first() is not None:
+        return False
+    if connection.execute(select(Account.id).limit(1)).first() is None:
+        return False
+    rebuild_book_aggregates(connection)
+    return True
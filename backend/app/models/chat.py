@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.session import Base
 
+# ChatMessage.status values: a user turn is "abandoned" when no reply was delivered
+# (the client disconnected or the request failed)
+MESSAGE_STATUS_COMPLETE = "complete"
+MESSAGE_STATUS_ABANDONED = "abandoned"
+
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
@@ -12,6 +17,10 @@ class ChatSession(Base):
     advisor_id = Column(String, index=True)
     started_at = Column(DateTime, default=datetime.utcnow)
     ended_at = Column(DateTime, nullable=True)
+    # Rolling summary of the oldest turns, and the timestamp of the last user
+    # message it covers
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime, nullable=True)
 
     # Relationships
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
@@ -19,12 +28,17 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Messages of a session in timestamp order (history, rehydration, pagination)
+        Index("ix_chat_messages_session_id_timestamp", "session_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"))
     role = Column(String)  # 'user' or 'assistant'
     content = Column(Text)
     chart_data = Column(JSON, nullable=True)
+    status = Column(String, default=MESSAGE_STATUS_COMPLETE, server_default=MESSAGE_STATUS_COMPLETE)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.session import Base
@@ -6,9 +6,13 @@ from app.database.session import Base
 
 class Customer(Base):
     __tablename__ = "customers"
+    __table_args__ = (
+        # Advisor lookups and keyset pagination on (advisor_id, id)
+        Index("ix_customers_advisor_id_id", "advisor_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    advisor_id = Column(String, index=True)
+    advisor_id = Column(String)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True)
     phone = Column(String)
@@ -22,6 +26,10 @@ class Customer(Base):
 
 class Account(Base):
     __tablename__ = "accounts"
+    __table_args__ = (
+        # Accounts of a customer, optionally narrowed to one account type
+        Index("ix_accounts_customer_id_account_type", "customer_id", "account_type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"))
@@ -0,0 +1,183 @@
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.balance_history import BalanceSnapshot, account_series, advisor_series, customer_series
+from app.models.customer import Account, Customer
+from app.services.customer_index import CustomerSnapshot, format_currency
+from app.services.customer_service import async_customer_service
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Accounts read, and snapshot rows written, per statement
+SNAPSHOT_BATCH_SIZE = 5000
+
+
+def quarter_start(day: date) -> date:
+    return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+
+
+class BalanceHistoryService:
+    """
+    Daily balance history in the balance_snapshots table
+
+    The snapshot job appends one row per account, customer and advisor (and
+    advisor per account type) each day. Readers ask for a date range of one
+    or a few series and get NumPy arrays back, so a year of an advisor's book
+    is one index range read of 365 rows rather than an aggregate over every
+    account.
+    """
+
+    @staticmethod
+    async def snapshot(db: AsyncSession, day: date = None, batch_size: int = SNAPSHOT_BATCH_SIZE) -> int:
+        """
+        Record every account's current balance, and the customer and advisor
+        totals, as the closing balances of day (default: today, UTC)
+
+        Re-running for the same day replaces that day's rows. Accounts are read
+        in keyset pages so memory stays bounded by the number of customers.
+        Returns the number of rows written.
+        """
+        day = day or datetime.utcnow().date()
+        totals: Dict[str, float] = defaultdict(float)
+        written = 0
+        last_id = 0
+        try:
+            while True:
+                result = await db.execute(
+                    select(Account.id, Account.customer_id, Customer.advisor_id, Account.account_type, Account.balance)
+                    .join(Customer, Account.customer_id == Customer.id)
+                    .filter(Account.id > last_id)
+                    .order_by(Account.id)
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                for _, customer_id, advisor_id, account_type, balance in rows:
+                    balance = balance or 0.0
+                    totals[customer_series(customer_id)] += balance
+                    if advisor_id is not None:
+                        totals[advisor_series(advisor_id)] += balance
+                        totals[advisor_series(advisor_id, account_type or "unknown")] += balance
+                written += await BalanceHistoryService._write(
+                    db, day, [(account_series(row[0]), row[4] or 0.0) for row in rows]
+                )
+
+            items = list(totals.items())
+            for start in range(0, len(items), batch_size):
+                written += await BalanceHistoryService._write(db, day, items[start:start + batch_size])
+            await db.commit()
+            logger.info(f"Recorded {written:,} balance snapshots for {day.isoformat()}")
+            return written
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error recording balance snapshots: {e}")
+            raise
+
+    @staticmethod
+    async def _write(db: AsyncSession, day: date, balances: List[Tuple[str, float]]) -> int:
+        """Replace day's rows for the given series; deletes go through the primary key"""
+        series = [name for name, _ in balances]
+        await db.execute(
+            delete(BalanceSnapshot).where(BalanceSnapshot.series.in_(series), BalanceSnapshot.day == day)
+        )
+        await db.execute(
+            insert(BalanceSnapshot),
+            [{"series": name, "day": day, "balance": balance} for name, balance in balances],
+        )
+        return len(balances)
+
+    @staticmethod
+    async def read_range(
+        db: AsyncSession, series: Sequence[str], start: date, end: date
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Daily balances from start through end, summed over the given series
+
+        Returns (days, balances): datetime64[D] and float64 arrays in date
+        order, covering only the days that were snapshotted.
+        """
+        if not series:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64)
+        try:
+            result = await db.execute(
+                select(BalanceSnapshot.day, func.sum(BalanceSnapshot.balance))
+                .where(BalanceSnapshot.series.in_(list(series)), BalanceSnapshot.day.between(start, end))
+                .group_by(BalanceSnapshot.day)
+                .order_by(BalanceSnapshot.day)
+            )
+            rows = result.all()
+        except Exception as e:
+            logger.error(f"Error reading balance history: {e}")
+            raise
+        days = np.array([row[0] for row in rows], dtype="datetime64[D]")
+        balances = np.fromiter((row[1] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+        return days, balances
+
+    @staticmethod
+    async def series_for(
+        db: AsyncSession, advisor_id: str, customer_ids: Sequence[int] = (), account_types: Sequence[str] = ()
+    ) -> List[str]:
+        """
+        The fewest series whose sum is the advisor's book restricted to some
+        customers and account types
+
+        Customer ids are checked against the advisor, so another advisor's
+        history cannot be read by naming their customers.
+        """
+        if not customer_ids:
+            if not account_types:
+                return [advisor_series(advisor_id)]
+            return [advisor_series(advisor_id, account_type) for account_type in account_types]
+        if not account_types:
+            owned = await async_customer_service.get_owned_customer_ids(db, advisor_id, list(customer_ids))
+            return [customer_series(customer_id) for customer_id in owned]
+        account_ids = await async_customer_service.get_account_ids(
+            db, advisor_id, list(customer_ids), list(account_types)
+        )
+        return [account_series(account_id) for account_id in account_ids]
+
+    @staticmethod
+    async def describe_performance(db: AsyncSession, customer: CustomerSnapshot, today: date = None) -> str:
+        """
+        How a customer's total balance moved over the last 30 days, the
+        quarter and the year to date, for the agent
+
+        One read of the customer's series covers every period.
+        """
+        today = today or datetime.utcnow().date()
+        periods = {
+            "last 30 days": today - timedelta(days=30),
+            "quarter to date": quarter_start(today),
+            "year to date": date(today.year, 1, 1),
+        }
+        days, balances = await BalanceHistoryService.read_range(
+            db, [customer_series(customer.id)], min(periods.values()), today
+        )
+        if not len(days):
+            return f"No balance history has been recorded for {customer.name} yet."
+
+        lines = []
+        for label, start in periods.items():
+            selected = balances[days >= np.datetime64(start, "D")]
+            if not len(selected):
+                continue
+            first, last = float(selected[0]), float(selected[-1])
+            change = f"{(last - first) / first:+.1%}" if first else "n/a"
+            lines.append(
+                f"{label}: {format_currency(first)} to {format_currency(last)} "
+                f"({'+' if last >= first else '-'}{format_currency(abs(last - first))}, {change}; "
+                f"low {format_currency(float(selected.min()))}, high {format_currency(float(selected.max()))})"
+            )
+        return (
+            f"Balance history for {customer.name} (customer ID {customer.id}) through "
+            f"{np.datetime_as_string(days[-1], unit='D')}: " + "; ".join(lines)
+        )
+
+balance_history_service = BalanceHistoryService()
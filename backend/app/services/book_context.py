@@ -0,0 +1,109 @@
+from app.services.customer_index import CustomerIndex, format_currency
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def build_book_context(index: CustomerIndex, max_chars: int) -> str:
+    """
+    Compact text summary of an advisor's book for the agent prompt
+
+    Starts with totals by account type, then one line per customer (largest
+    first) with ID, total and balances by account type. Customers that do not
+    fit in max_chars are counted in a final line so the agent knows to use the
+    tools for them.
+    """
+    if not len(index):
+        return "This advisor has no customers."
+
+    totals: Dict[str, float] = {}
+    for customer in index.customers:
+        for account_type, amount in customer.balances_by_type().items():
+            totals[account_type] = totals.get(account_type, 0.0) + amount
+    overall = sum(totals.values())
+    by_type = ", ".join(
+        f"{account_type} {format_currency(amount)}"
+        for account_type, amount in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    )
+    lines = [f"{len(index)} customers, {format_currency(overall)} total ({by_type or 'no accounts'})"]
+    used = len(lines[0])
+
+    customers = sorted(index.customers, key=lambda customer: customer.total_balance, reverse=True)
+    for shown, customer in enumerate(customers):
+        balances = ", ".join(
+            f"{account_type} {format_currency(amount)}"
+            for account_type, amount in sorted(customer.balances_by_type().items())
+        )
+        line = (
+            f"- {customer.name} (ID {customer.id}, {customer.account_status}): "
+            f"{format_currency(customer.total_balance)}" + (f" = {balances}" if balances else "")
+        )
+        if used + len(line) + 1 > max_chars:
+            lines.append(f"- ... and {len(customers) - shown} smaller customers not listed; use the tools for them")
+            break
+        lines.append(line)
+        used += len(line) + 1
+
+    return "\n".join(lines)
+
+
+def describe_book_totals(totals: List[Tuple[str, float, int]], top_customers: List[Tuple[int, str, float]]) -> str:
+    """
+    An advisor's total, breakdown by account type and largest customers for
+    the agent, from (account_type, balance, accounts) and (id, name, balance) rows
+    """
+    if not totals:
+        return "This advisor has no accounts."
+    overall = sum(balance for _, balance, _ in totals)
+    accounts = sum(count for _, _, count in totals)
+    by_type = ", ".join(
+        f"{account_type} {format_currency(balance)} ({balance / overall:.1%}, {count} account(s))"
+        if overall else f"{account_type} {format_currency(balance)} ({count} account(s))"
+        for account_type, balance, count in sorted(totals, key=lambda row: row[1], reverse=True)
+    )
+    top = ", ".join(
+        f"{name} (ID {customer_id}) {format_currency(balance)}" for customer_id, name, balance in top_customers
+    )
+    return (
+        f"Total assets under management: {format_currency(overall)} across {accounts} account(s). "
+        f"By account type: {by_type}. Top {len(top_customers)} customers by balance: {top or 'none'}"
+    )
+
+
+class BookContextCache:
+    """
+    Per-advisor cache of book context text, keyed by the advisor's data version
+
+    An entry is only reused while the advisor's customer data version is
+    unchanged, so any write to their customers or accounts forces a rebuild.
+    """
+
+    def __init__(self, max_advisors: int):
+        self.max_advisors = max_advisors
+        self._entries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, advisor_id: str, data_version: str) -> Optional[str]:
+        entry = self._entries.get(advisor_id)
+        if entry is None or entry[0] != data_version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(advisor_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, advisor_id: str, data_version: str, text: str):
+        self._entries[advisor_id] = (data_version, text)
+        self._entries.move_to_end(advisor_id)
+        while len(self._entries) > self.max_advisors:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, advisor_id: str = None):
+        """Drop one advisor's entry, or all entries"""
+        if advisor_id:
+            self._entries.pop(advisor_id, None)
+        else:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"advisors": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,442 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.services.balance_history import balance_history_service
+from app.services.customer_service import async_customer_service
+from app.services.downsampling import METHOD_LTTB, METHODS, MIN_POINTS, downsample
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_TYPES = ("accounts", "portfolio", "performance")
+CHART_TYPES = ("bar", "line", "pie", "doughnut")
+GROUP_BY = ("account_type", "customer")
+
+DEFAULT_PERFORMANCE_MONTHS = 6
+MAX_PERFORMANCE_MONTHS = 120
+DEFAULT_TOP_CUSTOMERS = 10
+MAX_TOP_CUSTOMERS = 50
+
+# Chart.js colors, cycled when there are more series than colors
+PALETTE = (
+    (54, 162, 235), (75, 192, 192), (255, 206, 86), (153, 102, 255),
+    (255, 99, 132), (255, 159, 64), (201, 203, 207),
+)
+BACKGROUND_COLORS = tuple(f"rgba({r}, {g}, {b}, 0.6)" for r, g, b in PALETTE)
+BORDER_COLORS = tuple(f"rgba({r}, {g}, {b}, 1)" for r, g, b in PALETTE)
+
+CURRENCY_TICKS = {"callback": "function(value) { return '$' + value.toLocaleString(); }"}
+MONTH_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def _colors(palette: Tuple[str, ...], count: int) -> List[str]:
+    return [palette[i % len(palette)] for i in range(count)]
+
+
+@lru_cache(maxsize=256)
+def _options(chart_type: str, title: str, currency_axis: bool, begin_at_zero: bool = True,
+             legend_position: Optional[str] = None) -> dict:
+    """
+    Chart.js options for a chart type and title
+
+    Cached, so repeated charts share one options dict; callers must not modify it.
+    """
+    legend = {"display": chart_type in ("pie", "doughnut") or legend_position is not None}
+    if legend_position:
+        legend["position"] = legend_position
+    options = {
+        "responsive": True,
+        "plugins": {
+            "title": {"display": True, "text": title},
+            "legend": legend,
+        },
+    }
+    if currency_axis and chart_type in ("bar", "line"):
+        options["scales"] = {"y": {"beginAtZero": begin_at_zero, "ticks": CURRENCY_TICKS}}
+    return options
+
+
+def _month_index(year: int, month: int) -> int:
+    """Months since year 0, so month ranges are plain integer ranges"""
+    return year * 12 + month - 1
+
+
+def _month_start(index: int) -> datetime:
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _month_label(index: int) -> str:
+    return f"{MONTH_NAMES[index % 12]} {index // 12}"
+
+
+def _parse_month(value: Any, name: str) -> int:
+    """Month index of a YYYY-MM or YYYY-MM-DD string or a date"""
+    if isinstance(value, (date, datetime)):
+        return _month_index(value.year, value.month)
+    try:
+        parts = str(value).split("-")
+        return _month_index(int(parts[0]), int(parts[1]))
+    except (ValueError, IndexError):
+        raise ValueError(f"{name} must be a date like 2024-01-31 or 2024-01")
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+@dataclass(frozen=True)
+class ChartFilters:
+    """
+    Validated chart filters
+
+    Date ranges select whole months: accounts and portfolio charts cover
+    accounts opened from start_month through end_month, performance charts
+    plot the daily balance history of those months (the last `months`
+    months by default).
+    """
+    advisor_id: str
+    customer_ids: Tuple[int, ...] = ()
+    account_types: Tuple[str, ...] = ()
+    start_month: Optional[int] = None
+    end_month: Optional[int] = None
+    months: int = DEFAULT_PERFORMANCE_MONTHS
+    group_by: str = "account_type"
+    limit: int = DEFAULT_TOP_CUSTOMERS
+
+    @classmethod
+    def parse(cls, filters: Dict[str, Any]) -> "ChartFilters":
+        """Build from a request's filters dict, raising ValueError on bad input"""
+        advisor_id = filters.get("advisor_id")
+        if not advisor_id:
+            raise ValueError("filters.advisor_id is required")
+
+        try:
+            customer_ids = tuple(sorted({
+                int(value) for value in _as_list(filters.get("customer_ids", filters.get("customer_id")))
+            }))
+            months = int(filters.get("months", DEFAULT_PERFORMANCE_MONTHS))
+            limit = int(filters.get("limit", DEFAULT_TOP_CUSTOMERS))
+        except (TypeError, ValueError):
+            raise ValueError("customer_id(s), months and limit must be integers")
+        account_types = tuple(sorted({
+            str(value).strip().lower() for value in _as_list(filters.get("account_types", filters.get("account_type")))
+        }))
+
+        start_month = _parse_month(filters["start_date"], "start_date") if filters.get("start_date") else None
+        end_month = _parse_month(filters["end_date"], "end_date") if filters.get("end_date") else None
+        if start_month is not None and end_month is not None and start_month > end_month:
+            raise ValueError("start_date must not be after end_date")
+
+        group_by = filters.get("group_by", "account_type")
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of: {', '.join(GROUP_BY)}")
+
+        return cls(
+            advisor_id=str(advisor_id),
+            customer_ids=customer_ids,
+            account_types=account_types,
+            start_month=start_month,
+            end_month=end_month,
+            months=min(max(months, 1), MAX_PERFORMANCE_MONTHS),
+            group_by=group_by,
+            limit=min(max(limit, 1), MAX_TOP_CUSTOMERS),
+        )
+
+    @property
+    def frame_key(self) -> Tuple[str, Tuple[int, ...], Tuple[str, ...]]:
+        """Filters applied in SQL; charts with the same key can share one BookFrame"""
+        return self.advisor_id, self.customer_ids, self.account_types
+
+    def performance_window(self, today: date = None) -> Tuple[int, int]:
+        """First and last month plotted by a performance chart"""
+        today = today or date.today()
+        last = self.end_month if self.end_month is not None else _month_index(today.year, today.month)
+        first = self.start_month if self.start_month is not None else last - self.months + 1
+        return first, last
+
+
+@dataclass(frozen=True)
+class ChartSpec:
+    """A validated chart request"""
+    data_type: str
+    chart_type: str
+    filters: ChartFilters
+    # Most points in a time series; longer series are downsampled
+    max_points: int
+    downsample: str = METHOD_LTTB
+
+    @classmethod
+    def parse(cls, data_type: str, chart_type: str, filters: Dict[str, Any], max_points: int = None,
+              downsample: str = METHOD_LTTB) -> "ChartSpec":
+        """Validate a chart request, raising ValueError on bad input"""
+        if data_type not in DATA_TYPES:
+            raise ValueError("Invalid data_type")
+        if chart_type not in CHART_TYPES:
+            raise ValueError(f"chart_type must be one of: {', '.join(CHART_TYPES)}")
+        if max_points is not None and max_points < MIN_POINTS:
+            raise ValueError(f"max_points must be at least {MIN_POINTS}")
+        if downsample not in METHODS:
+            raise ValueError(f"downsample must be one of: {', '.join(METHODS)}")
+        # The server-side cap keeps payloads bounded even when max_points is not given
+        max_points = min(max_points or settings.CHART_MAX_POINTS, settings.CHART_MAX_POINTS)
+        return cls(data_type, chart_type, ChartFilters.parse(filters), max_points, downsample)
+
+    @property
+    def needs_frame(self) -> bool:
+        """
+        Whether the chart is built from a BookFrame (top customer charts query
+        directly and performance charts read the balance history)
+        """
+        if self.data_type == "performance":
+            return False
+        return not (self.data_type == "accounts" and self.filters.group_by == "customer")
+
+    @property
+    def needs_months(self) -> bool:
+        """Whether the chart needs balances broken down by opening month"""
+        return self.filters.start_month is not None or self.filters.end_month is not None
+
+
+class BookFrame:
+    """
+    An advisor's balances aggregated by account type and opening month
+
+    Loaded with one grouped query; every account and portfolio chart and the
+    estimated performance series are NumPy reductions over these few hundred rows. A
+    frame loaded without months has one row per account type and can only
+    serve charts over all months.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[str, Optional[int], Optional[int], float, int]], by_month: bool = True):
+        self.by_month = by_month
+        self.account_types: List[str] = sorted({row[0] or "unknown" for row in rows})
+        positions = {account_type: i for i, account_type in enumerate(self.account_types)}
+        count = len(rows)
+        self.type_index = np.fromiter((positions[row[0] or "unknown"] for row in rows), dtype=np.intp, count=count)
+        # Accounts without an opening date count as opened before any window
+        self.month = np.fromiter(
+            (_month_index(int(row[1]), int(row[2])) if row[1] is not None else 0 for row in rows),
+            dtype=np.int64, count=count,
+        )
+        self.balance = np.fromiter((row[3] or 0.0 for row in rows), dtype=np.float64, count=count)
+        self.accounts = np.fromiter((row[4] for row in rows), dtype=np.int64, count=count)
+
+    def __len__(self) -> int:
+        return len(self.balance)
+
+    def _in_range(self, start_month: Optional[int], end_month: Optional[int]) -> np.ndarray:
+        if not self.by_month and (start_month is not None or end_month is not None):
+            raise ValueError("Frame was loaded without months")
+        mask = np.ones(len(self), dtype=bool)
+        if start_month is not None:
+            mask &= self.month >= start_month
+        if end_month is not None:
+            mask &= self.month <= end_month
+        return mask
+
+    def balances_by_type(self, start_month: int = None, end_month: int = None) -> np.ndarray:
+        """Total balance per entry of account_types, for accounts opened in the range"""
+        mask = self._in_range(start_month, end_month)
+        return np.bincount(self.type_index[mask], weights=self.balance[mask], minlength=len(self.account_types))
+
+    def value_by_month(self, first_month: int, last_month: int) -> np.ndarray:
+        """
+        Book value at the end of each month from first_month to last_month
+
+        Without balance history this is the current balance of every account
+        opened by the end of that month.
+        """
+        if not self.by_month:
+            raise ValueError("Frame was loaded without months")
+        keep = self.month <= last_month
+        offsets = np.clip(self.month[keep] - first_month, 0, None)
+        per_month = np.bincount(offsets, weights=self.balance[keep], minlength=last_month - first_month + 1)
+        return np.cumsum(per_month)
+
+
+class ChartService:
+    """Builds Chart.js payloads for the /charts endpoints from advisor data"""
+
+    @staticmethod
+    async def load_frame(db: AsyncSession, filters: ChartFilters, by_month: bool = True) -> BookFrame:
+        """
+        Aggregate the advisor's accounts selected by filters
+
+        Without months or customer filters this reads the maintained
+        per-advisor totals (a row per account type) instead of the accounts.
+        """
+        if not by_month and not filters.customer_ids:
+            rows = [
+                (account_type, None, None, balance, accounts)
+                for account_type, balance, accounts in await async_customer_service.get_book_totals(
+                    db, filters.advisor_id
+                )
+                if not filters.account_types or account_type in filters.account_types
+            ]
+            return BookFrame(rows, by_month)
+        rows = await async_customer_service.get_balances_by_type_and_month(
+            db, filters.advisor_id, list(filters.customer_ids), list(filters.account_types), by_month
+        )
+        return BookFrame(rows, by_month)
+
+    async def generate(self, db: AsyncSession, spec: ChartSpec) -> dict:
+        """Load the data for one chart and build it"""
+        frame = None
+        if spec.needs_frame:
+            frame = await self.load_frame(db, spec.filters, spec.needs_months)
+        return await self.build(db, spec, frame)
+
+    async def generate_batch(self, db: AsyncSession, specs: List[ChartSpec]) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Build several charts, loading data once per distinct set of SQL filters
+
+        Charts with the same frame_key share one BookFrame (broken down by
+        month if any of them needs it). Yields (index in specs, chart) as each
+        chart is built, frame by frame.
+        """
+        shared: Dict[Tuple, List[int]] = {}
+        direct: List[int] = []
+        for index, spec in enumerate(specs):
+            if spec.needs_frame:
+                shared.setdefault(spec.filters.frame_key, []).append(index)
+            else:
+                direct.append(index)
+
+        for indices in shared.values():
+            by_month = any(specs[index].needs_months for index in indices)
+            frame = await self.load_frame(db, specs[indices[0]].filters, by_month)
+            for index in indices:
+                yield index, await self.build(db, specs[index], frame)
+
+        for index in direct:
+            yield index, await self.build(db, specs[index], None)
+
+    async def build(self, db: AsyncSession, spec: ChartSpec, frame: Optional[BookFrame]) -> dict:
+        """Build one chart from a frame loaded with the same frame_key (None if not needs_frame)"""
+        if spec.data_type == "accounts":
+            if spec.filters.group_by == "customer":
+                return await self._top_customers_chart(db, spec.chart_type, spec.filters)
+            return self._account_chart(spec.chart_type, spec.filters, frame)
+        if spec.data_type == "portfolio":
+            return self._portfolio_chart(spec.chart_type, spec.filters, frame)
+        return await self._performance_chart(db, spec)
+
+    @staticmethod
+    def _account_chart(chart_type: str, filters: ChartFilters, frame: BookFrame) -> dict:
+        """Total balance by account type"""
+        totals = frame.balances_by_type(filters.start_month, filters.end_month)
+        count = len(frame.account_types)
+        return {
+            "chartType": chart_type,
+            "data": {
+                "labels": [account_type.title() for account_type in frame.account_types],
+                "datasets": [{
+                    "label": "Account Balances",
+                    "data": totals.round(2).tolist(),
+                    "backgroundColor": _colors(BACKGROUND_COLORS, count),
+                    "borderColor": _colors(BORDER_COLORS, count),
+                    "borderWidth": 1,
+                }],
+            },
+            "options": _options(chart_type, "Account Balances by Type", True),
+        }
+
+    @staticmethod
+    async def _top_customers_chart(db: AsyncSession, chart_type: str, filters: ChartFilters) -> dict:
+        """Customers with the largest total balance"""
+        if filters.customer_ids or filters.account_types or filters.start_month is not None \
+                or filters.end_month is not None:
+            rows = await async_customer_service.get_top_customers(
+                db, filters.advisor_id, filters.limit, list(filters.customer_ids), list(filters.account_types),
+                opened_from=_month_start(filters.start_month) if filters.start_month is not None else None,
+                opened_before=_month_start(filters.end_month + 1) if filters.end_month is not None else None,
+            )
+        else:
+            rows = await async_customer_service.get_top_customer_totals(db, filters.advisor_id, filters.limit)
+        balances = np.fromiter((row[2] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+        return {
+            "chartType": chart_type,
+            "data": {
+                "labels": [row[1] for row in rows],
+                "datasets": [{
+                    "label": "Total Balance",
+                    "data": balances.round(2).tolist(),
+                    "backgroundColor": _colors(BACKGROUND_COLORS, len(rows)),
+                    "borderColor": _colors(BORDER_COLORS, len(rows)),
+                    "borderWidth": 1,
+                }],
+            },
+            "options": _options(chart_type, f"Top {filters.limit} Customers by Balance", True),
+        }
+
+    @staticmethod
+    def _portfolio_chart(chart_type: str, filters: ChartFilters, frame: BookFrame) -> dict:
+        """Share of the total balance in each account type"""
+        totals = frame.balances_by_type(filters.start_month, filters.end_month)
+        overall = totals.sum()
+        shares = totals / overall * 100 if overall > 0 else np.zeros_like(totals)
+        return {
+            "chartType": chart_type,
+            "data": {
+                "labels": [account_type.title() for account_type in frame.account_types],
+                "datasets": [{
+                    "label": "Portfolio Allocation",
+                    "data": shares.round(2).tolist(),
+                    "backgroundColor": _colors(BACKGROUND_COLORS, len(frame.account_types)),
+                }],
+            },
+            "options": _options(chart_type, "Portfolio Allocation (%)", False, legend_position="right"),
+        }
+
+    async def _performance_chart(self, db: AsyncSession, spec: ChartSpec) -> dict:
+        """
+        Daily book value over the window from the balance history, downsampled
+        to max_points
+
+        Until the snapshot job has recorded any history for the window, falls
+        back to month-end values estimated from current balances.
+        """
+        filters = spec.filters
+        first, last = filters.performance_window()
+        end = min(_month_start(last + 1).date() - timedelta(days=1), date.today())
+        series = await balance_history_service.series_for(
+            db, filters.advisor_id, filters.customer_ids, filters.account_types
+        )
+        days, values = await balance_history_service.read_range(db, series, _month_start(first).date(), end)
+
+        if len(days):
+            keep = downsample(values, spec.max_points, spec.downsample)
+            labels = np.datetime_as_string(days[keep], unit="D").tolist()
+        else:
+            frame = await self.load_frame(db, filters, True)
+            values = frame.value_by_month(first, last)
+            keep = downsample(values, spec.max_points, spec.downsample)
+            labels = [_month_label(first + int(offset)) for offset in keep]
+
+        chart_type = spec.chart_type
+        months = last - first + 1
+        return {
+            "chartType": chart_type,
+            "data": {
+                "labels": labels,
+                "datasets": [{
+                    "label": "Portfolio Value",
+                    "data": values[keep].round(2).tolist(),
+                    "fill": False,
+                    "borderColor": BORDER_COLORS[1],
+                    "tension": 0.1,
+                }],
+            },
+            "options": _options(
+                chart_type, f"Portfolio Performance ({months} Month{'s' if months != 1 else ''})", True,
+                begin_at_zero=False, legend_position="top",
+            ),
+        }
+
+chart_service = ChartService()
@@ -1,6 +1,9 @@
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.chat import ChatSession, ChatMessage
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 import uuid
 import logging
 
@@ -79,5 +82,145 @@ class ChatService:
             raise
 
 
+class AsyncChatService:
+    """Async service for chat session and message operations"""
+
+    @staticmethod
+    async def create_session(db: AsyncSession, advisor_id: str) -> ChatSession:
+        """Create a new chat session"""
+        try:
+            session_id = str(uuid.uuid4())
+            session = ChatSession(
+                session_id=session_id,
+                advisor_id=advisor_id
+            )
+            db.add(session)
+            await db.commit()
+            await db.refresh(session)
+            return session
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error creating chat session: {e}")
+            raise
+
+    @staticmethod
+    async def get_session(db: AsyncSession, session_id: str, advisor_id: str) -> Optional[ChatSession]:
+        """Get a chat session by ID (with advisor access check)"""
+        try:
+            result = await db.execute(
+                select(ChatSession).filter(
+                    ChatSession.session_id == session_id,
+                    ChatSession.advisor_id == advisor_id
+                )
+            )
+            return result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error fetching chat session: {e}")
+            raise
+
+    @staticmethod
+    async def add_message(
+        db: AsyncSession,
+        session_id: int,
+        role: str,
+        content: str,
+        chart_data: dict = None
+    ) -> ChatMessage:
+        """Add a message to a chat session"""
+        try:
+            message = ChatMessage(
+                session_id=session_id,
+                role=role,
+                content=content,
+                chart_data=chart_data
+            )
+            db.add(message)
+            await db.commit()
+            await db.refresh(message)
+            return message
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error adding chat message: {e}")
+            raise
+
+    @staticmethod
+    async def update_session_summary(db: AsyncSession, session_id: str, summary: str,
+                                     summary_until: Optional[datetime]):
+        """Store the rolling summary of a session's oldest turns, up to the user message at summary_until"""
+        try:
+            await db.execute(
+                update(ChatSession).where(
+                    ChatSession.session_id == session_id
+                ).values(summary=summary, summary_until=summary_until)
+            )
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error updating chat session summary: {e}")
+            raise
+
+    @staticmethod
+    async def get_session_messages(db: AsyncSession, session_id: int) -> List[ChatMessage]:
+        """Get all messages for a chat session"""
+        try:
+            result = await db.execute(
+                select(ChatMessage).filter(
+                    ChatMessage.session_id == session_id
+                ).order_by(ChatMessage.timestamp)
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error fetching chat messages: {e}")
+            raise
+
+    @staticmethod
+    async def get_session_messages_page(
+        db: AsyncSession,
+        session_id: int,
+        limit: Optional[int],
+        after: Tuple[datetime, int] = None,
+        fields: List[str] = None
+    ) -> Tuple[List[Any], Optional[Tuple[datetime, int]]]:
+        """
+        Get one page of a session's messages using keyset pagination on (session_id, timestamp)
+
+        Ties on timestamp are broken by id. With fields, only those columns
+        (plus id and timestamp) are selected and rows are returned as dicts.
+        A limit of None returns every remaining message. Returns the page and
+        the (timestamp, id) to resume after, or None when this is the last page.
+        """
+        try:
+            if fields:
+                names = dict.fromkeys(["id", "timestamp", *fields])
+                query = select(*[getattr(ChatMessage, name) for name in names])
+            else:
+                query = select(ChatMessage)
+
+            query = query.filter(ChatMessage.session_id == session_id)
+            if after is not None:
+                query = query.filter(tuple_(ChatMessage.timestamp, ChatMessage.id) > tuple_(*after))
+            query = query.order_by(ChatMessage.timestamp, ChatMessage.id)
+            if limit is not None:
+                query = query.limit(limit + 1)
+
+            result = await db.execute(query)
+            if fields:
+                rows = [dict(row._mapping) for row in result.all()]
+            else:
+                rows = list(result.scalars().all())
+
+            if limit is None or len(rows) <= limit:
+                return rows, None
+            rows = rows[:limit]
+            last = rows[-1]
+            if fields:
+                return rows, (last["timestamp"], last["id"])
+            return rows, (last.timestamp, last.id)
+        except Exception as e:
+            logger.error(f"Error fetching chat message page: {e}")
+            raise
+
+
 chat_service = ChatService()
+async_chat_service = AsyncChatService()
 
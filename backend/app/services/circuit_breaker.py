@@ -0,0 +1,93 @@
+from typing import Any, Dict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is down
+
+    After failure_threshold consecutive failures (errors or timeouts) the
+    circuit opens and calls are refused for reset_seconds. Then a single trial
+    call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether a call made now would be refused"""
+        if self.state == STATE_OPEN:
+            return time.monotonic() - self.opened_at < self.reset_seconds
+        return self.state == STATE_HALF_OPEN and self._trial_in_flight
+
+    def before_call(self):
+        """Admit a call, or raise CircuitOpenError"""
+        if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = STATE_HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == STATE_OPEN or (self.state == STATE_HALF_OPEN and self._trial_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        if self.state == STATE_HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self):
+        if self.state != STATE_CLOSED:
+            logger.info(f"Closing {self.name} circuit")
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def record_cancelled(self):
+        """Forget a call that was abandoned before it finished"""
+        self._trial_in_flight = False
+
+    def _open(self):
+        if self.state != STATE_OPEN:
+            self.opens += 1
+            logger.warning(
+                f"Opening {self.name} circuit after {self.consecutive_failures} failure(s) "
+                f"for {self.reset_seconds:g}s"
+            )
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        if state == STATE_OPEN and not self.is_open:
+            # The next call will be the trial
+            state = STATE_HALF_OPEN
+        return {
+            "state": state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
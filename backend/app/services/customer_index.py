@@ -0,0 +1,225 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.customer_service import async_customer_service
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import re
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a name and strip punctuation, quotes and extra whitespace"""
+    return " ".join(_NON_WORD.sub(" ", name or "").lower().split())
+
+
+def format_currency(amount: float) -> str:
+    """Format an amount as US dollars"""
+    return f"${amount:,.2f}"
+
+
+@dataclass
+class AccountSnapshot:
+    """Detached copy of an account row"""
+    id: int
+    account_number: str
+    account_type: str
+    balance: float
+
+
+@dataclass
+class CustomerSnapshot:
+    """Detached copy of a customer row and its accounts"""
+    id: int
+    name: str
+    email: str
+    phone: Optional[str]
+    account_status: str
+    accounts: List[AccountSnapshot] = field(default_factory=list)
+
+    @property
+    def total_balance(self) -> float:
+        return sum(account.balance for account in self.accounts)
+
+    def balances_by_type(self) -> Dict[str, float]:
+        """Sum of balances per account type"""
+        totals: Dict[str, float] = {}
+        for account in self.accounts:
+            totals[account.account_type] = totals.get(account.account_type, 0.0) + account.balance
+        return totals
+
+
+class CustomerIndex:
+    """
+    In-memory index of one advisor's customers for name lookups
+
+    Built from a single query over the advisor's customers and accounts, so
+    lookups during an agent run never go back to the database.
+    """
+
+    def __init__(self, advisor_id: str, customers: List[CustomerSnapshot]):
+        self.advisor_id = advisor_id
+        self.customers = customers
+        self.by_id: Dict[int, CustomerSnapshot] = {}
+        self._by_name: Dict[str, List[CustomerSnapshot]] = {}
+        self._by_token: Dict[str, List[CustomerSnapshot]] = {}
+
+        for customer in customers:
+            self.by_id[customer.id] = customer
+            normalized = normalize_name(customer.name)
+            self._by_name.setdefault(normalized, []).append(customer)
+            for token in set(normalized.split()):
+                self._by_token.setdefault(token, []).append(customer)
+
+    def __len__(self) -> int:
+        return len(self.customers)
+
+    def find(self, name: str) -> List[CustomerSnapshot]:
+        """
+        Find customers matching a name
+
+        Tries an exact full-name match first, then customers whose names
+        contain every given word (e.g. "Smith" or "john smith").
+        """
+        normalized = normalize_name(name)
+        if not normalized:
+            return []
+
+        exact = self._by_name.get(normalized)
+        if exact:
+            return list(exact)
+
+        tokens = normalized.split()
+        candidates = self._by_token.get(tokens[0], [])
+        for token in tokens[1:]:
+            ids = {customer.id for customer in self._by_token.get(token, [])}
+            candidates = [customer for customer in candidates if customer.id in ids]
+        return list(candidates)
+
+    def find_exact(self, name: str) -> List[CustomerSnapshot]:
+        """Customers whose full name matches exactly (ignoring case and punctuation)"""
+        return list(self._by_name.get(normalize_name(name), []))
+
+    def find_exact_token(self, token: str) -> List[CustomerSnapshot]:
+        """Customers with a first, middle or last name equal to token"""
+        return list(self._by_token.get(normalize_name(token), []))
+
+    @classmethod
+    async def load(cls, db: AsyncSession, advisor_id: str) -> "CustomerIndex":
+        """Build the index for an advisor from the database"""
+        customers = await async_customer_service.get_customers_with_accounts(db, advisor_id)
+        return cls(advisor_id, [
+            CustomerSnapshot(
+                id=customer.id,
+                name=customer.name,
+                email=customer.email,
+                phone=customer.phone,
+                account_status=customer.account_status,
+                accounts=[
+                    AccountSnapshot(
+                        id=account.id,
+                        account_number=account.account_number,
+                        account_type=account.account_type,
+                        balance=account.balance or 0.0,
+                    )
+                    for account in customer.accounts
+                ],
+            )
+            for customer in customers
+        ])
+
+
+class CustomerIndexCache:
+    """
+    Per-advisor cache of customer indexes, keyed by the advisor's data version
+
+    Saves reloading every customer and account on each chat request. An
+    index is only reused while the advisor's data version is unchanged.
+    """
+
+    def __init__(self, max_advisors: int):
+        self.max_advisors = max_advisors
+        self._entries: "OrderedDict[str, Tuple[str, CustomerIndex]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, advisor_id: str, data_version: str) -> Optional[CustomerIndex]:
+        entry = self._entries.get(advisor_id)
+        if entry is None or entry[0] != data_version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(advisor_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, advisor_id: str, data_version: str, index: CustomerIndex):
+        self._entries[advisor_id] = (data_version, index)
+        self._entries.move_to_end(advisor_id)
+        while len(self._entries) > self.max_advisors:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, advisor_id: str = None):
+        """Drop one advisor's entry, or all entries"""
+        if advisor_id:
+            self._entries.pop(advisor_id, None)
+        else:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"advisors": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def describe_customer(customer: CustomerSnapshot) -> str:
+    """One-line description of a customer for the agent"""
+    return (
+        f"{customer.name} (customer ID {customer.id}): status {customer.account_status}, "
+        f"email {customer.email}, phone {customer.phone or 'n/a'}, "
+        f"{len(customer.accounts)} account(s), total balance {format_currency(customer.total_balance)}"
+    )
+
+
+def describe_balance(customer: CustomerSnapshot) -> str:
+    """Total balance with a per-account breakdown"""
+    if not customer.accounts:
+        return f"{customer.name} has no accounts."
+    breakdown = "; ".join(
+        f"{account.account_type} {account.account_number}: {format_currency(account.balance)}"
+        for account in customer.accounts
+    )
+    return (
+        f"Total account balance for {customer.name}: {format_currency(customer.total_balance)} "
+        f"across {len(customer.accounts)} account(s) ({breakdown})"
+    )
+
+
+def describe_accounts(customer: CustomerSnapshot) -> str:
+    """List of a customer's accounts"""
+    if not customer.accounts:
+        return f"{customer.name} has no accounts."
+    lines = "\n".join(
+        f"- {account.account_type.title()} {account.account_number}: {format_currency(account.balance)}"
+        for account in customer.accounts
+    )
+    return f"{customer.name} has {len(customer.accounts)} account(s):\n{lines}"
+
+
+def describe_portfolio(customer: CustomerSnapshot) -> str:
+    """Allocation of a customer's balances by account type"""
+    total = customer.total_balance
+    if not customer.accounts or total <= 0:
+        return f"{customer.name} has no funded accounts."
+    allocation = ", ".join(
+        f"{amount / total:.1%} {account_type} ({format_currency(amount)})"
+        for account_type, amount in sorted(
+            customer.balances_by_type().items(), key=lambda item: item[1], reverse=True
+        )
+    )
+    return f"Portfolio for {customer.name} ({format_currency(total)} total): {allocation}"
+
+
+def describe_matches(name: str, matches: List[CustomerSnapshot]) -> str:
+    """Explain a failed or ambiguous name lookup"""
+    if not matches:
+        return f"No customer named '{name}' was found among this advisor's customers."
+    options = ", ".join(f"{customer.name} (ID {customer.id})" for customer in matches[:10])
+    return f"Multiple customers match '{name}': {options}. Please specify the full name."
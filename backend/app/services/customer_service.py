@@ -1,6 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import extract, func, null, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from app.models.customer import Customer, Account
-from typing import List, Optional
+from app.models.book_aggregates import AdvisorBookTotal, AdvisorDataVersion, CustomerBookTotal
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -78,5 +82,331 @@ class CustomerService:
             raise
 
 
+class AsyncCustomerService:
+    """Async service for customer-related operations"""
+
+    @staticmethod
+    async def get_customers_by_advisor(db: AsyncSession, advisor_id: str) -> List[Customer]:
+        """Get all customers for a specific advisor"""
+        try:
+            result = await db.execute(
+                select(Customer).filter(
+                    Customer.advisor_id == advisor_id
+                )
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error fetching customers: {e}")
+            raise
+
+    @staticmethod
+    async def get_customers_page(
+        db: AsyncSession,
+        advisor_id: str,
+        limit: Optional[int],
+        after_id: int = None,
+        fields: List[str] = None
+    ) -> Tuple[List[Any], Optional[int]]:
+        """
+        Get one page of an advisor's customers using keyset pagination on (advisor_id, id)
+
+        With fields, only those columns (plus id) are selected and rows are
+        returned as dicts. A limit of None returns every remaining customer.
+        Returns the page and the id to resume after, or None when this is
+        the last page.
+        """
+        try:
+            if fields:
+                columns = [getattr(Customer, name) for name in dict.fromkeys(["id", *fields])]
+                query = select(*columns)
+            else:
+                query = select(Customer)
+
+            query = query.filter(Customer.advisor_id == advisor_id)
+            if after_id is not None:
+                query = query.filter(Customer.id > after_id)
+            query = query.order_by(Customer.id)
+            if limit is not None:
+                query = query.limit(limit + 1)
+
+            result = await db.execute(query)
+            if fields:
+                rows = [dict(row._mapping) for row in result.all()]
+            else:
+                rows = list(result.scalars().all())
+
+            if limit is None or len(rows) <= limit:
+                return rows, None
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, last["id"] if fields else last.id
+        except Exception as e:
+            logger.error(f"Error fetching customer page: {e}")
+            raise
+
+    @staticmethod
+    async def get_customers_with_accounts(db: AsyncSession, advisor_id: str) -> List[Customer]:
+        """Get all customers for an advisor with their accounts eagerly loaded"""
+        try:
+            result = await db.execute(
+                select(Customer).filter(
+                    Customer.advisor_id == advisor_id
+                ).options(selectinload(Customer.accounts))
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error fetching customers with accounts: {e}")
+            raise
+
+    @staticmethod
+    async def get_customer_by_id(db: AsyncSession, customer_id: int, advisor_id: str) -> Optional[Customer]:
+        """Get a specific customer by ID (with advisor access check)"""
+        try:
+            result = await db.execute(
+                select(Customer).filter(
+                    Customer.id == customer_id,
+                    Customer.advisor_id == advisor_id
+                )
+            )
+            return result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error fetching customer: {e}")
+            raise
+
+    @staticmethod
+    async def get_customer_details(db: AsyncSession, customer_ids: List[int], advisor_id: str) -> List[Customer]:
+        """
+        Get customers with their accounts in a single query (with advisor access check)
+
+        Accounts are joined eagerly, so totals can be computed from the loaded
+        rows via total_balance() without further queries.
+        """
+        try:
+            if not customer_ids:
+                return []
+            result = await db.execute(
+                select(Customer).filter(
+                    Customer.id.in_(customer_ids),
+                    Customer.advisor_id == advisor_id
+                ).options(joinedload(Customer.accounts))
+            )
+            return list(result.unique().scalars().all())
+        except Exception as e:
+            logger.error(f"Error fetching customer details: {e}")
+            raise
+
+    @staticmethod
+    async def get_customer_detail(db: AsyncSession, customer_id: int, advisor_id: str) -> Optional[Customer]:
+        """Get a customer with accounts loaded in a single query (with advisor access check)"""
+        customers = await AsyncCustomerService.get_customer_details(db, [customer_id], advisor_id)
+        return customers[0] if customers else None
+
+    @staticmethod
+    def total_balance(customer: Customer) -> float:
+        """Total balance across a customer's already-loaded accounts"""
+        return sum(account.balance or 0.0 for account in customer.accounts)
+
+    @staticmethod
+    async def create_customer(db: AsyncSession, advisor_id: str, name: str, email: str, phone: str = None) -> Customer:
+        """Create a new customer"""
+        try:
+            customer = Customer(
+                advisor_id=advisor_id,
+                name=name,
+                email=email,
+                phone=phone
+            )
+            db.add(customer)
+            await db.commit()
+            await db.refresh(customer)
+            return customer
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error creating customer: {e}")
+            raise
+
+    @staticmethod
+    async def get_customer_accounts(db: AsyncSession, customer_id: int) -> List[Account]:
+        """Get all accounts for a customer"""
+        try:
+            result = await db.execute(
+                select(Account).filter(
+                    Account.customer_id == customer_id
+                )
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error fetching accounts: {e}")
+            raise
+
+    @staticmethod
+    async def get_total_balance(db: AsyncSession, customer_id: int) -> float:
+        """Calculate total balance across all accounts for a customer"""
+        try:
+            result = await db.execute(
+                select(func.coalesce(func.sum(Account.balance), 0.0)).filter(
+                    Account.customer_id == customer_id
+                )
+            )
+            return float(result.scalar_one())
+        except Exception as e:
+            logger.error(f"Error calculating total balance: {e}")
+            raise
+
+    @staticmethod
+    async def get_data_version(db: AsyncSession, advisor_id: str) -> str:
+        """
+        Stamp that changes whenever an advisor's customers or accounts change
+
+        Read from the counter the book aggregate events bump on every ORM
+        write, so it costs one primary key lookup whatever the book size.
+        """
+        try:
+            result = await db.execute(
+                select(AdvisorDataVersion.version).filter(AdvisorDataVersion.advisor_id == advisor_id)
+            )
+            return str(result.scalar() or 0)
+        except Exception as e:
+            logger.error(f"Error reading data version: {e}")
+            raise
+
+    @staticmethod
+    def _filter_accounts(query, advisor_id: str, customer_ids: List[int] = None, account_types: List[str] = None):
+        """Restrict an Account query to an advisor's accounts, optionally to some customers and types"""
+        query = query.join(Customer, Account.customer_id == Customer.id).filter(Customer.advisor_id == advisor_id)
+        if customer_ids:
+            query = query.filter(Account.customer_id.in_(customer_ids))
+        if account_types:
+            query = query.filter(Account.account_type.in_(account_types))
+        return query
+
+    @staticmethod
+    async def get_balances_by_type_and_month(
+        db: AsyncSession,
+        advisor_id: str,
+        customer_ids: List[int] = None,
+        account_types: List[str] = None,
+        by_month: bool = True,
+    ) -> List[Tuple[str, Optional[int], Optional[int], float, int]]:
+        """
+        Sum and count of an advisor's account balances per account type and
+        month the account was opened, in one grouped query
+
+        Returns (account_type, year, month, balance, accounts) rows. Without
+        by_month, rows are per account type only and year and month are None,
+        which is several times cheaper.
+        """
+        try:
+            if by_month:
+                year = extract("year", Account.created_at)
+                month = extract("month", Account.created_at)
+                groups = (Account.account_type, year, month)
+            else:
+                year = month = null()
+                groups = (Account.account_type,)
+            query = AsyncCustomerService._filter_accounts(
+                select(Account.account_type, year, month, func.sum(Account.balance), func.count(Account.id)),
+                advisor_id, customer_ids, account_types,
+            ).group_by(*groups)
+            result = await db.execute(query)
+            return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(f"Error aggregating balances: {e}")
+            raise
+
+    @staticmethod
+    async def get_top_customers(
+        db: AsyncSession,
+        advisor_id: str,
+        limit: int,
+        customer_ids: List[int] = None,
+        account_types: List[str] = None,
+        opened_from: datetime = None,
+        opened_before: datetime = None,
+    ) -> List[Tuple[int, str, float]]:
+        """Customers with the largest total balance, as (id, name, balance) rows"""
+        try:
+            total = func.sum(Account.balance)
+            query = AsyncCustomerService._filter_accounts(
+                select(Customer.id, Customer.name, total), advisor_id, customer_ids, account_types
+            )
+            if opened_from is not None:
+                query = query.filter(Account.created_at >= opened_from)
+            if opened_before is not None:
+                query = query.filter(Account.created_at < opened_before)
+            query = query.group_by(Customer.id, Customer.name).order_by(total.desc(), Customer.id).limit(limit)
+            result = await db.execute(query)
+            return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(f"Error fetching top customers: {e}")
+            raise
+
+    @staticmethod
+    async def get_book_totals(db: AsyncSession, advisor_id: str) -> List[Tuple[str, float, int]]:
+        """
+        An advisor's total balance and account count per account type, as
+        (account_type, balance, accounts) rows from the maintained aggregates
+        """
+        try:
+            result = await db.execute(
+                select(AdvisorBookTotal.account_type, AdvisorBookTotal.balance, AdvisorBookTotal.accounts)
+                .filter(AdvisorBookTotal.advisor_id == advisor_id)
+                .order_by(AdvisorBookTotal.account_type)
+            )
+            return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(f"Error fetching book totals: {e}")
+            raise
+
+    @staticmethod
+    async def get_top_customer_totals(db: AsyncSession, advisor_id: str, limit: int) -> List[Tuple[int, str, float]]:
+        """
+        Customers with the largest total balance, as (id, name, balance) rows,
+        read from the first limit entries of the maintained customer totals
+        """
+        try:
+            result = await db.execute(
+                select(CustomerBookTotal.customer_id, Customer.name, CustomerBookTotal.balance)
+                .join(Customer, CustomerBookTotal.customer_id == Customer.id)
+                .filter(CustomerBookTotal.advisor_id == advisor_id)
+                .order_by(CustomerBookTotal.balance.desc(), CustomerBookTotal.customer_id)
+                .limit(limit)
+            )
+            return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(f"Error fetching top customer totals: {e}")
+            raise
+
+    @staticmethod
+    async def get_owned_customer_ids(db: AsyncSession, advisor_id: str, customer_ids: List[int]) -> List[int]:
+        """The subset of customer_ids that belong to the advisor"""
+        try:
+            result = await db.execute(
+                select(Customer.id)
+                .filter(Customer.advisor_id == advisor_id, Customer.id.in_(customer_ids))
+                .order_by(Customer.id)
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error checking customer ownership: {e}")
+            raise
+
+    @staticmethod
+    async def get_account_ids(
+        db: AsyncSession, advisor_id: str, customer_ids: List[int] = None, account_types: List[str] = None
+    ) -> List[int]:
+        """Ids of an advisor's accounts, optionally only of some customers and types"""
+        try:
+            query = AsyncCustomerService._filter_accounts(
+                select(Account.id), advisor_id, customer_ids, account_types
+            ).order_by(Account.id)
+            result = await db.execute(query)
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error fetching account ids: {e}")
+            raise
+
+
 customer_service = CustomerService()
+async_customer_service = AsyncCustomerService()
 
@@ -0,0 +1,84 @@
+from typing import Optional
+import numpy as np
+
+METHOD_LTTB = "lttb"
+METHOD_MINMAX = "minmax"
+METHODS = (METHOD_LTTB, METHOD_MINMAX)
+
+# Fewest points either method can reduce a series to (first, one pick, last)
+MIN_POINTS = 3
+
+
+def lttb(y: np.ndarray, threshold: int, x: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Indices of at most threshold points picked by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept. The points in between are split
+    into threshold - 2 buckets, and from each bucket the point forming the
+    largest triangle with the previously picked point and the average of the
+    next bucket is kept. Bucket averages and triangle areas are computed with
+    NumPy; only the walk over buckets is a Python loop.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # threshold - 2 buckets over the interior points 1 .. n - 2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Third vertex for each bucket: the next bucket's average, or the last point
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    picked = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[picked], y[picked]
+        areas = np.abs((ax - next_x[bucket]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[bucket] - ay))
+        picked = lo + int(np.argmax(areas))
+        selected[bucket + 1] = picked
+    return selected
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of at most threshold points: the minimum and maximum of each bucket
+
+    Keeps every peak and trough, at the cost of the shape between them. Fully
+    vectorized: the series is padded into a (buckets, size) grid and reduced
+    along each row.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+
+    if threshold < 4:
+        # No room for a min and a max besides the end points
+        return lttb(y, threshold)
+
+    # Up to two picks per bucket plus the first and last points
+    size = -(-n // ((threshold - 2) // 2))
+    buckets = -(-n // size)
+    grid = np.full(buckets * size, np.nan)
+    grid[:n] = y
+    grid = grid.reshape(buckets, size)
+    starts = np.arange(buckets) * size
+    return np.unique(np.concatenate((
+        [0, n - 1], starts + np.nanargmin(grid, axis=1), starts + np.nanargmax(grid, axis=1),
+    )))
+
+
+def downsample(y: np.ndarray, max_points: int, method: str = METHOD_LTTB) -> np.ndarray:
+    """Indices of the points to keep so a series has at most max_points"""
+    if method == METHOD_MINMAX:
+        return minmax(y, max_points)
+    if method == METHOD_LTTB:
+        return lttb(y, max_points)
+    raise ValueError(f"downsample must be one of: {', '.join(METHODS)}")
@@ -0,0 +1,133 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.config import settings
+from app.database.session import async_engine
+from typing import Any, Dict, List, Optional
+import aiohttp
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+
+
+def _model_names(payload: dict) -> List[str]:
+    return [m.get("name") or m.get("model") or "" for m in payload.get("models") or []]
+
+
+def _has_model(names: List[str], model: str) -> bool:
+    """Whether Ollama lists model, treating an untagged name as :latest"""
+    wanted = model if ":" in model else f"{model}:latest"
+    return any(name in (model, wanted) for name in names)
+
+
+class ReadinessChecker:
+    """
+    Cached readiness probes for the database and the Ollama servers
+
+    The database check is a SELECT 1; the Ollama check asks each server which
+    models are loaded (/api/ps) and which are installed (/api/tags). Results
+    are reused for cache_seconds, and concurrent probes share one check, so a
+    load balancer polling at high frequency adds no load on the dependencies.
+    """
+
+    def __init__(self, engine: AsyncEngine, ollama_urls: List[str], model: str, cache_seconds: float,
+                 timeout_seconds: float, require_model_loaded: bool = False):
+        self.engine = engine
+        self.ollama_urls = ollama_urls
+        self.model = model
+        self.cache_seconds = cache_seconds
+        self.timeout_seconds = timeout_seconds
+        self.require_model_loaded = require_model_loaded
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._check: Optional[asyncio.Task] = None
+
+    async def check(self) -> Dict[str, Any]:
+        """Readiness of every dependency, from cache when fresh"""
+        if self._result is not None and time.monotonic() - self._checked_at < self.cache_seconds:
+            return {**self._result, "age_seconds": round(time.monotonic() - self._checked_at, 3)}
+
+        if self._check is None or self._check.done():
+            self._check = asyncio.create_task(self._run_checks())
+        # Shielded so a probe that gives up does not cancel the check others are waiting on
+        self._result = await asyncio.shield(self._check)
+        self._checked_at = time.monotonic()
+        return {**self._result, "age_seconds": 0.0}
+
+    async def _run_checks(self) -> Dict[str, Any]:
+        database, ollama = await asyncio.gather(self.check_database(), self.check_ollama())
+        ready = database["status"] == STATUS_UP and ollama["status"] == STATUS_UP
+        if not ready:
+            logger.warning(f"Not ready: database {database['status']}, ollama {ollama['status']}")
+        return {"ready": ready, "database": database, "ollama": ollama}
+
+    async def check_database(self) -> Dict[str, Any]:
+        """Run SELECT 1 against the database"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._ping_database(), self.timeout_seconds)
+            return {"status": STATUS_UP, "latency_ms": self._elapsed_ms(started)}
+        except Exception as e:
+            return {"status": STATUS_DOWN, "latency_ms": self._elapsed_ms(started), "error": str(e) or repr(e)}
+
+    async def _ping_database(self):
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def check_ollama(self) -> Dict[str, Any]:
+        """Check every Ollama server; up if any of them can serve the model"""
+        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            servers = await asyncio.gather(*(self._check_server(session, url) for url in self.ollama_urls))
+        up = any(server["status"] == STATUS_UP for server in servers)
+        return {"status": STATUS_UP if up else STATUS_DOWN, "model": self.model, "servers": servers}
+
+    async def _check_server(self, session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            loaded, installed = await asyncio.gather(
+                self._list_models(session, f"{url}/api/ps"),
+                self._list_models(session, f"{url}/api/tags"),
+            )
+        except Exception as e:
+            return {"url": url, "status": STATUS_DOWN, "latency_ms": self._elapsed_ms(started),
+                    "error": str(e) or repr(e)}
+
+        model_loaded = _has_model(loaded, self.model)
+        # Ollama unloads idle models, so by default an installed model is enough;
+        # the first call after an unload just takes longer
+        usable = model_loaded if self.require_model_loaded else model_loaded or _has_model(installed, self.model)
+        result = {
+            "url": url,
+            "status": STATUS_UP if usable else STATUS_DOWN,
+            "latency_ms": self._elapsed_ms(started),
+            "model_loaded": model_loaded,
+        }
+        if not usable:
+            result["error"] = f"model {self.model} is not {'loaded' if self.require_model_loaded else 'installed'}"
+        return result
+
+    @staticmethod
+    async def _list_models(session: aiohttp.ClientSession, url: str) -> List[str]:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return _model_names(await response.json())
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+
+
+# Global instance
+readiness_checker = ReadinessChecker(
+    async_engine,
+    [url for url, _ in settings.get_ollama_backends()],
+    settings.OLLAMA_MODEL,
+    cache_seconds=settings.HEALTH_CACHE_SECONDS,
+    timeout_seconds=settings.HEALTH_CHECK_TIMEOUT_SECONDS,
+    require_model_loaded=settings.HEALTH_REQUIRE_MODEL_LOADED,
+)
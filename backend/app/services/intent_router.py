@@ -0,0 +1,126 @@
+from app.services.customer_index import (
+    CustomerIndex,
+    CustomerSnapshot,
+    describe_accounts,
+    describe_balance,
+    describe_customer,
+    describe_portfolio,
+    normalize_name,
+)
+from typing import Callable, Dict, List, Optional
+import re
+
+# Longest customer name, in words, looked for in a message
+MAX_NAME_WORDS = 4
+
+POSSESSIVE = re.compile(r"['’]s\b")
+
+# Questions that need reasoning rather than a lookup always go to the agent
+OPEN_ENDED = re.compile(
+    r"\b(why|should|recommend|suggest|advice|advise|compare|versus|vs|explain|predict|forecast|"
+    r"rebalance|strategy|if|risk|all|top|every|which|clients|customers)\b"
+)
+
+# Checked in order; the first matching intent wins
+INTENT_PATTERNS = [
+    ("allocation", re.compile(r"\b(allocation|allocated|portfolio|breakdown|mix|split|diversif\w*)\b")),
+    ("accounts", re.compile(r"\b(accounts|account list|account numbers?)\b")),
+    ("balance", re.compile(r"\b(balances?|how much|worth|total|aum|assets)\b")),
+    ("lookup", re.compile(r"\b(who is|info|information|details|contact|email|phone|status|look ?up)\b")),
+]
+
+
+ANSWERS: Dict[str, Callable[[CustomerSnapshot], str]] = {
+    "allocation": describe_portfolio,
+    "accounts": describe_accounts,
+    "balance": describe_balance,
+    "lookup": describe_customer,
+}
+
+
+class IntentMatch:
+    """A message answered deterministically from customer data"""
+
+    def __init__(self, intent: str, answer: str, customer: Optional[CustomerSnapshot] = None):
+        self.intent = intent
+        self.answer = answer
+        self.customer = customer
+
+
+class IntentRouter:
+    """
+    Cheap keyword router for common lookup questions
+
+    Recognizes balance, account list, allocation and customer lookup
+    questions that name exactly one of the advisor's customers, and answers
+    them straight from the customer index. Anything else returns None and
+    goes to the ReAct agent.
+    """
+
+    def __init__(self, max_words: int = 25):
+        self.max_words = max_words
+
+    def classify(self, message: str) -> Optional[str]:
+        """Return the intent of a short lookup question, or None for open-ended ones"""
+        text = message.lower()
+        if len(text.split()) > self.max_words or OPEN_ENDED.search(text):
+            return None
+        for intent, pattern in INTENT_PATTERNS:
+            if pattern.search(text):
+                return intent
+        return None
+
+    def find_customers(self, message: str, index: CustomerIndex) -> List[CustomerSnapshot]:
+        """Find the customers a message refers to by full name, falling back to a single name"""
+        message = POSSESSIVE.sub("", message)
+        words = normalize_name(message).split()
+
+        # Longest full-name matches first (n-grams of the message)
+        for size in range(min(MAX_NAME_WORDS, len(words)), 1, -1):
+            found: Dict[int, CustomerSnapshot] = {}
+            for start in range(len(words) - size + 1):
+                for customer in index.find_exact(" ".join(words[start:start + size])):
+                    found[customer.id] = customer
+            if found:
+                return list(found.values())
+
+        # Single capitalized words, e.g. "Smith's balance"
+        candidates: Dict[int, CustomerSnapshot] = {}
+        for word in re.findall(r"\b[A-Z][a-zA-Z-]+\b", message):
+            for customer in index.find_exact_token(word):
+                candidates[customer.id] = customer
+        return list(candidates.values())
+
+    def route(self, message: str, index: CustomerIndex) -> Optional[IntentMatch]:
+        """Answer a message from the index if it is a recognized lookup"""
+        intent = self.classify(message)
+        if intent is None:
+            return None
+
+        matches = self.find_customers(message, index)
+        if not matches:
+            return None
+        if len(matches) > 1:
+            options = ", ".join(f"{customer.name} (ID {customer.id})" for customer in matches[:10])
+            return IntentMatch(intent, f"More than one of your customers matches: {options}. Which one did you mean?")
+
+        customer = matches[0]
+        return IntentMatch(intent, ANSWERS[intent](customer), customer)
+
+    def fallback(self, message: str, index: CustomerIndex) -> Optional[IntentMatch]:
+        """
+        Best-effort answer from customer data when the agent is unavailable
+
+        Unlike route(), open-ended and long questions are accepted: if they
+        name one customer, the closest lookup intent (or a customer summary)
+        is answered.
+        """
+        text = message.lower()
+        intent = next((name for name, pattern in INTENT_PATTERNS if pattern.search(text)), "lookup")
+
+        matches = self.find_customers(message, index)
+        if len(matches) != 1:
+            return None
+
+        customer = matches[0]
+        return IntentMatch(intent, ANSWERS[intent](customer), customer)
@@ -3,30 +3,421 @@ from langchain.agents import AgentExecutor, create_react_agent
 from langchain.memory import ConversationBufferMemory
 from langchain.tools import Tool
 from langchain.prompts import PromptTemplate
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from langchain_core.callbacks import AsyncCallbackHandler
 from app.core.config import settings
+from app.core.metrics import CHAT_ANSWERS, agent_metrics, llm_metrics
+from app.database.session import AsyncSessionLocal
+from app.models.chat import MESSAGE_STATUS_ABANDONED
+from app.services.balance_history import balance_history_service
+from app.services.chat_service import async_chat_service
+from app.services.customer_index import (
+    CustomerIndex,
+    CustomerIndexCache,
+    describe_balance,
+    describe_customer,
+    describe_matches,
+    describe_portfolio,
+    normalize_name,
+)
+from app.services.customer_service import async_customer_service
+from app.services.intent_router import IntentRouter
+from app.services.book_context import BookContextCache, build_book_context, describe_book_totals
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm_scheduler import LLMScheduler, SchedulerRejectedError
+from app.services.ollama_pool import OllamaBackend, OllamaPool, PooledOllama, llm_deadline, llm_session_id
+from app.services.response_cache import ResponseCache
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+import inspect
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Prompt used to phrase fast-path answers when INTENT_FAST_PATH_LLM_PHRASING is on
+PHRASING_TEMPLATE = """You are a helpful AI assistant for financial advisors at Stifel Financial Group.
+Answer the advisor's question in one or two professional sentences using only these facts.
+
+Facts: {facts}
+
+Question: {question}
+Answer:"""
+
+# Prompt used to fold old conversation turns into the rolling summary
+SUMMARY_TEMPLATE = """Summarize this conversation between a financial advisor and an AI assistant.
+Keep customer names, figures and open questions; drop pleasantries. Use at most five sentences.
+
+Summary so far: {summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+# Customers listed by the BookSummary tool
+BOOK_SUMMARY_TOP_CUSTOMERS = 10
+
+# Book context shown to the agent when BOOK_CONTEXT_ENABLED is off
+NO_BOOK_CONTEXT = "Not available; use the tools to look up customers."
+
+# Scheduler queue used for background summarization
+SUMMARY_QUEUE = "__summarizer__"
+
+# Rough characters per token, used to keep the history window within its token budget
+CHARS_PER_TOKEN = 4
+
+# Reply when the LLM is unavailable and the question cannot be answered from customer data
+DEGRADED_MESSAGE = (
+    "The assistant is temporarily unavailable. I can still answer questions about a specific "
+    "customer's balance, accounts or portfolio allocation if you name the customer."
+)
+
+# Reply when the agent stopped before answering and the question names no customer
+INCOMPLETE_MESSAGE = (
+    "I wasn't able to complete that request. Try asking about a specific customer's balance, "
+    "accounts or portfolio allocation."
+)
+
+# Output AgentExecutor returns when it hits its iteration or time limit
+AGENT_STOPPED_PREFIX = "Agent stopped"
+
+# Rough per-message overhead (object headers, role, metadata) used when
+# estimating how much memory a conversation state holds
+MESSAGE_OVERHEAD_BYTES = 256
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class RollingSummaryMemory(ConversationBufferMemory):
+    """
+    Conversation memory that shows the agent a bounded window of recent turns
+
+    The prompt gets the rolling summary of older turns, then the most recent
+    turns verbatim, up to max_turns and max_tokens. Turns that have fallen out
+    of the window stay in chat_memory until they are folded into the summary
+    (see LangChainService._summarize) and dropped.
+    """
+
+    summary: str = ""
+    # When each turn in chat_memory was received; the timestamp its user
+    # message is stored with
+    turn_times: List[Optional[datetime]] = []
+    # Timestamp of the last user message folded into the summary (persisted
+    # with the session); stored messages up to it are not replayed
+    summary_until: Optional[datetime] = None
+    max_turns: int = 6
+    max_tokens: int = 1500
+
+    def turns_in_window(self) -> int:
+        """Number of most recent turns that fit in the window"""
+        messages = self.chat_memory.messages
+        turns, tokens = 0, 0
+        for end in range(len(messages), 1, -2):
+            turn_tokens = estimate_tokens(messages[end - 2].content) + estimate_tokens(messages[end - 1].content)
+            if turns >= self.max_turns or tokens + turn_tokens > self.max_tokens:
+                break
+            turns += 1
+            tokens += turn_tokens
+        return turns
+
+    def turns_outside_window(self) -> int:
+        """Number of unsummarized turns that no longer fit in the window"""
+        return len(self.chat_memory.messages) // 2 - self.turns_in_window()
+
+    @property
+    def buffer_as_messages(self) -> List[BaseMessage]:
+        window = self.turns_in_window()
+        messages = self.chat_memory.messages[len(self.chat_memory.messages) - 2 * window:] if window else []
+        if self.summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"), *messages]
+        return list(messages)
+
+    @property
+    def buffer_as_str(self) -> str:
+        return get_buffer_string(self.buffer_as_messages, human_prefix=self.human_prefix,
+                                 ai_prefix=self.ai_prefix)
+
+    def save_turn(self, message: str, answer: str, received_at: Optional[datetime]):
+        """Save a turn along with the time its user message was received"""
+        self.save_context({"input": message}, {"output": answer})
+        self.turn_times.append(received_at)
+
+    def forget_turn(self, received_at: datetime) -> bool:
+        """Drop the unsummarized turn received at received_at; False if it is not in memory"""
+        for turn in range(len(self.turn_times) - 1, -1, -1):
+            if self.turn_times[turn] == received_at:
+                del self.chat_memory.messages[2 * turn:2 * turn + 2]
+                del self.turn_times[turn]
+                return True
+        return False
+
+    def fold(self, turns: int, summary: Optional[str]):
+        """Drop the oldest turns from memory, replacing the summary if one is given"""
+        del self.chat_memory.messages[:2 * turns]
+        folded, self.turn_times = self.turn_times[:turns], self.turn_times[turns:]
+        times = [time for time in folded if time is not None]
+        if times:
+            self.summary_until = max([*times, self.summary_until or times[0]])
+        if summary is not None:
+            self.summary = summary
+
+
+class ConversationState:
+    """
+    Agent executor and memory for a single chat session
+
+    The executor runs without memory: the history is passed in as an input
+    and LangChainService._remember saves each turn exactly once, whichever
+    path answered it.
+    """
+
+    def __init__(self, session_id: str, advisor_id: str, memory: RollingSummaryMemory,
+                 agent_executor: AgentExecutor):
+        self.session_id = session_id
+        self.advisor_id = advisor_id
+        self.memory = memory
+        self.agent_executor = agent_executor
+        self.last_used = time.monotonic()
+        self.size_bytes = 0
+        self.summary_task: Optional[asyncio.Task] = None
+        self.measure()
+
+    def measure(self) -> int:
+        """Recompute the approximate memory held by this conversation"""
+        self.size_bytes = len(self.memory.summary) + sum(
+            len(message.content) + MESSAGE_OVERHEAD_BYTES
+            for message in self.memory.chat_memory.messages
+        )
+        return self.size_bytes
+
+
+class ToolContext:
+    """
+    Request-scoped data for agent tools
+
+    The advisor's customer index is taken from the shared index cache, or
+    loaded once on the first tool call, and tool results are memoized so
+    repeated calls across ReAct iterations do not touch the database again.
+    """
+
+    def __init__(self, advisor_id: str, data_version: str = None, indexes: CustomerIndexCache = None):
+        self.advisor_id = advisor_id
+        self.data_version = data_version
+        self.indexes = indexes if data_version is not None else None
+        self.results: Dict[tuple, str] = {}
+        self._index: Optional[CustomerIndex] = None
+        self._lock = asyncio.Lock()
+
+    def peek_index(self) -> Optional[CustomerIndex]:
+        """The advisor's customer index if it is already in memory, without touching the database"""
+        if self._index is None and self.indexes is not None:
+            self._index = self.indexes.get(self.advisor_id, self.data_version)
+        return self._index
+
+    async def get_index(self) -> CustomerIndex:
+        """Get the advisor's customer index, loading and caching it on a miss"""
+        async with self._lock:
+            if self.peek_index() is None:
+                async with AsyncSessionLocal() as db:
+                    self._index = await CustomerIndex.load(db, self.advisor_id)
+                if self.indexes is not None:
+                    self.indexes.put(self.advisor_id, self.data_version, self._index)
+            return self._index
+
+
+# Tool context of the agent run in progress
+_tool_context: ContextVar[Optional[ToolContext]] = ContextVar("tool_context", default=None)
+
+
+class StreamingEventHandler(AsyncCallbackHandler):
+    """Forward LLM tokens and agent step events to an asyncio queue"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        await self.queue.put({"event": "token", "token": token})
+
+    async def on_agent_action(self, action, **kwargs: Any) -> None:
+        await self.queue.put({
+            "event": "agent_action",
+            "tool": action.tool,
+            "tool_input": action.tool_input,
+        })
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        await self.queue.put({
+            "event": "tool_start",
+            "tool": serialized.get("name"),
+            "input": input_str,
+        })
+
+    async def on_tool_end(self, output: str, **kwargs: Any) -> None:
+        await self.queue.put({"event": "tool_end", "output": str(output)})
+
+
+class SessionPool:
+    """Bounded pool of conversation states with LRU/TTL eviction and a memory budget"""
+
+    def __init__(self, max_sessions: int, ttl_seconds: int, memory_budget_bytes: int):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.memory_budget_bytes = memory_budget_bytes
+        self._states: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, session_id: str) -> Optional[ConversationState]:
+        """Get a conversation state and mark it as recently used"""
+        state = self._states.get(session_id)
+        if state is None:
+            self.misses += 1
+            return None
+
+        if time.monotonic() - state.last_used > self.ttl_seconds:
+            self.discard(session_id)
+            self.misses += 1
+            return None
+
+        state.last_used = time.monotonic()
+        self._states.move_to_end(session_id)
+        self.hits += 1
+        return state
+
+    def put(self, state: ConversationState):
+        """Add a conversation state, evicting older ones if over budget"""
+        self.discard(state.session_id)
+        self._states[state.session_id] = state
+        self._total_bytes += state.size_bytes
+        self._evict()
+
+    def update_size(self, state: ConversationState):
+        """Re-measure a state after a turn and enforce the memory budget"""
+        if self._states.get(state.session_id) is not state:
+            return
+        self._total_bytes -= state.size_bytes
+        self._total_bytes += state.measure()
+        self._evict()
+
+    def discard(self, session_id: str):
+        """Remove a conversation state from the pool"""
+        state = self._states.pop(session_id, None)
+        if state is not None:
+            self._total_bytes -= state.size_bytes
+
+    def clear(self):
+        """Remove all conversation states"""
+        self._states.clear()
+        self._total_bytes = 0
+
+    def _evict(self):
+        """Drop expired states, then least recently used ones until within limits"""
+        now = time.monotonic()
+        expired = [
+            session_id for session_id, state in self._states.items()
+            if now - state.last_used > self.ttl_seconds
+        ]
+        for session_id in expired:
+            self.discard(session_id)
+            self.evictions += 1
+
+        # Always keep the most recently used state, even if it alone exceeds the budget
+        while len(self._states) > 1 and (
+            len(self._states) > self.max_sessions
+            or self._total_bytes > self.memory_budget_bytes
+        ):
+            _, state = self._states.popitem(last=False)
+            self._total_bytes -= state.size_bytes
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Pool occupancy and hit/miss counters"""
+        return {
+            "sessions": len(self._states),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
 
 class LangChainService:
     """Service for LangChain agent interactions with Ollama"""
 
     def __init__(self):
         self.llm = None
-        self.agent_executor = None
-        self.memory = None
+        self.pool = None
+        self.breaker = CircuitBreaker(
+            "Ollama",
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_seconds=settings.LLM_CIRCUIT_RESET_SECONDS,
+        )
+        self.router = IntentRouter(max_words=settings.INTENT_FAST_PATH_MAX_WORDS)
+        self.sessions = SessionPool(
+            max_sessions=settings.LLM_SESSION_POOL_MAX_SESSIONS,
+            ttl_seconds=settings.LLM_SESSION_TTL_SECONDS,
+            memory_budget_bytes=settings.LLM_SESSION_MEMORY_BUDGET_BYTES,
+        )
+        self.cache = ResponseCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+            sqlite_path=settings.RESPONSE_CACHE_SQLITE_PATH,
+        ) if settings.RESPONSE_CACHE_ENABLED else None
+        self.book_contexts = BookContextCache(
+            max_advisors=settings.BOOK_CONTEXT_MAX_ADVISORS,
+        ) if settings.BOOK_CONTEXT_ENABLED else None
+        self.indexes = CustomerIndexCache(
+            max_advisors=settings.CUSTOMER_INDEX_CACHE_MAX_ADVISORS,
+        ) if settings.CUSTOMER_INDEX_CACHE_MAX_ADVISORS > 0 else None
+        self.scheduler = LLMScheduler(
+            max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+            max_queue_size=settings.LLM_QUEUE_MAX_SIZE,
+            max_queue_per_advisor=settings.LLM_QUEUE_MAX_PER_ADVISOR,
+            max_wait_ms=settings.LLM_QUEUE_MAX_WAIT_MS,
+        )
         self._initialize_llm()
 
     def _initialize_llm(self):
-        """Initialize Ollama LLM"""
+        """Initialize Ollama LLM, balanced across the configured servers"""
         try:
-            self.llm = Ollama(
-                base_url=settings.OLLAMA_BASE_URL,
-                model=settings.OLLAMA_MODEL,
-                temperature=settings.OLLAMA_TEMPERATURE,
+            backends = [
+                OllamaBackend(url, weight, Ollama(
+                    base_url=url,
+                    model=settings.OLLAMA_MODEL,
+                    temperature=settings.OLLAMA_TEMPERATURE,
+                ))
+                for url, weight in settings.get_ollama_backends()
+            ]
+            self.pool = OllamaPool(
+                backends,
+                routing=settings.OLLAMA_ROUTING,
+                session_affinity=settings.OLLAMA_SESSION_AFFINITY,
+                eject_consecutive_failures=settings.OLLAMA_EJECT_CONSECUTIVE_FAILURES,
+                eject_error_rate=settings.OLLAMA_EJECT_ERROR_RATE,
+                eject_seconds=settings.OLLAMA_EJECT_SECONDS,
+            )
+            self.llm = PooledOllama(
+                pool=self.pool,
+                breaker=self.breaker,
+                call_timeout=settings.LLM_CALL_TIMEOUT_SECONDS,
+                callbacks=[llm_metrics] if settings.METRICS_ENABLED else None,
+            )
+            logger.info(
+                f"Initialized Ollama with model: {settings.OLLAMA_MODEL} "
+                f"on {len(backends)} server(s)"
             )
-            logger.info(f"Initialized Ollama with model: {settings.OLLAMA_MODEL}")
         except Exception as e:
             logger.error(f"Failed to initialize Ollama: {e}")
             raise
@@ -34,50 +425,104 @@ class LangChainService:
     def _create_tools(self, advisor_id: str) -> list:
         """Create LangChain tools for the agent"""
 
-        def get_customer_info(customer_name: str) -> str:
-            """Get customer information by name"""
-            # TODO: Implement actual database query
-            return f"Customer information for {customer_name}: Active account with balance $125,000"
-
-        def get_account_balance(customer_name: str) -> str:
-            """Get account balance for a customer"""
-            # TODO: Implement actual database query
-            return f"Total account balance for {customer_name}: $125,000"
-
-        def get_portfolio_summary(customer_name: str) -> str:
-            """Get portfolio summary for a customer"""
-            # TODO: Implement actual calculation
-            return f"Portfolio for {customer_name}: 60% stocks, 30% bonds, 10% cash"
+        def customer_tool(name: str, describe: Callable) -> Callable:
+            """
+            Build a tool coroutine that looks up a customer by name and describes it
+
+            describe takes the customer, or (db, customer) if it is a coroutine function.
+            """
+
+            async def run(customer_name: str) -> str:
+                context = _tool_context.get()
+                if context is None or context.advisor_id != advisor_id:
+                    context = ToolContext(advisor_id)
+
+                key = (name, normalize_name(customer_name))
+                if key not in context.results:
+                    index = await context.get_index()
+                    matches = index.find(customer_name)
+                    if len(matches) == 1 and inspect.iscoroutinefunction(describe):
+                        async with AsyncSessionLocal() as db:
+                            context.results[key] = await describe(db, matches[0])
+                    elif len(matches) == 1:
+                        context.results[key] = describe(matches[0])
+                    else:
+                        context.results[key] = describe_matches(customer_name.strip(), matches)
+                return context.results[key]
+
+            return run
+
+        async def book_summary(_: str = "") -> str:
+            context = _tool_context.get()
+            if context is None or context.advisor_id != advisor_id:
+                context = ToolContext(advisor_id)
+
+            key = ("BookSummary",)
+            if key not in context.results:
+                async with AsyncSessionLocal() as db:
+                    totals = await async_customer_service.get_book_totals(db, advisor_id)
+                    top_customers = await async_customer_service.get_top_customer_totals(
+                        db, advisor_id, BOOK_SUMMARY_TOP_CUSTOMERS
+                    )
+                context.results[key] = describe_book_totals(totals, top_customers)
+            return context.results[key]
 
         tools = [
             Tool(
                 name="CustomerInfo",
-                func=get_customer_info,
+                func=None,
+                coroutine=customer_tool("CustomerInfo", describe_customer),
                 description="Get basic information about a customer by their name. Input should be the customer's full name."
             ),
             Tool(
                 name="AccountBalance",
-                func=get_account_balance,
+                func=None,
+                coroutine=customer_tool("AccountBalance", describe_balance),
                 description="Get the total account balance for a customer. Input should be the customer's name."
             ),
             Tool(
                 name="PortfolioSummary",
-                func=get_portfolio_summary,
+                func=None,
+                coroutine=customer_tool("PortfolioSummary", describe_portfolio),
                 description="Get portfolio allocation summary for a customer. Input should be the customer's name."
             ),
+            Tool(
+                name="BalanceHistory",
+                func=None,
+                coroutine=customer_tool("BalanceHistory", balance_history_service.describe_performance),
+                description=(
+                    "Get how a customer's total balance changed over the last 30 days, this quarter and "
+                    "this year. Input should be the customer's name."
+                )
+            ),
+            Tool(
+                name="BookSummary",
+                func=None,
+                coroutine=book_summary,
+                description=(
+                    "Get the advisor's total assets under management, the breakdown by account type and "
+                    f"the top {BOOK_SUMMARY_TOP_CUSTOMERS} customers by balance. Input is ignored."
+                )
+            ),
         ]
 
         return tools
 
-    def create_agent(self, advisor_id: str) -> AgentExecutor:
-        """Create a LangChain agent with tools and memory"""
-
-        # Initialize memory for conversation context
-        self.memory = ConversationBufferMemory(
+    @staticmethod
+    def _create_memory() -> RollingSummaryMemory:
+        """Create windowed conversation memory sized from settings"""
+        return RollingSummaryMemory(
             memory_key="chat_history",
-            return_messages=True
+            # The prompt has other inputs (book_context); only the question is remembered
+            input_key="input",
+            return_messages=True,
+            max_turns=settings.MEMORY_WINDOW_TURNS,
+            max_tokens=settings.MEMORY_WINDOW_TOKENS,
         )
 
+    def create_agent(self, advisor_id: str) -> AgentExecutor:
+        """Create a LangChain agent with tools; chat_history is passed in with each input"""
+
         # Get tools
         tools = self._create_tools(advisor_id)
 
@@ -99,6 +544,12 @@ When answering questions:
    Action Input: [input to the tool]
    
 4. After getting the tool result, provide a clear answer to the advisor
+5. If the advisor's book below already answers the question, reply right away with
+   Final Answer: [your answer]
+   without using a tool
+
+Advisor's book (customer names, IDs and balances by account type):
+{book_context}
 
 Chat History:
 {chat_history}
@@ -108,7 +559,7 @@ Question: {input}
 
         prompt = PromptTemplate(
             template=template,
-            input_variables=["input", "chat_history", "agent_scratchpad", "tools", "tool_names"]
+            input_variables=["input", "chat_history", "book_context", "agent_scratchpad", "tools", "tool_names"]
         )
 
         # Create the agent
@@ -119,18 +570,291 @@ Question: {input}
         )
 
         # Create agent executor
-        self.agent_executor = AgentExecutor(
+        return AgentExecutor(
             agent=agent,
             tools=tools,
-            memory=self.memory,
             verbose=settings.DEBUG,
             max_iterations=3,
+            # Stop between iterations once the request's time budget is spent
+            max_execution_time=settings.LLM_REQUEST_TIMEOUT_SECONDS,
             handle_parsing_errors=True
         )
 
-        return self.agent_executor
+    async def _rehydrate_memory(self, memory: RollingSummaryMemory, advisor_id: str, session_id: str):
+        """Rebuild conversation memory from the stored summary and persisted chat messages"""
+        async with AsyncSessionLocal() as db:
+            session = await async_chat_service.get_session(db, session_id, advisor_id)
+            if not session:
+                return
+
+            messages = await async_chat_service.get_session_messages(db, session.id)
+
+        memory.summary = session.summary or ""
+        memory.summary_until = session.summary_until
+
+        # Replay completed user/assistant turns received after the summary's
+        # last one; abandoned user turns never got a reply and are skipped
+        pending = None
+        for message in messages:
+            if message.status == MESSAGE_STATUS_ABANDONED:
+                continue
+            if message.role == "user":
+                covered = memory.summary_until is not None and message.timestamp is not None \
+                    and message.timestamp <= memory.summary_until
+                pending = None if covered else message
+            elif message.role == "assistant" and pending is not None:
+                memory.save_turn(pending.content, message.content, pending.timestamp)
+                pending = None
+
+    async def get_conversation(self, advisor_id: str, session_id: str = None) -> ConversationState:
+        """Get the pooled conversation state for a session, rehydrating it on a miss"""
+        if session_id:
+            state = self.sessions.get(session_id)
+            if state is not None and state.advisor_id == advisor_id:
+                return state
+
+        memory = self._create_memory()
+
+        if session_id:
+            try:
+                await self._rehydrate_memory(memory, advisor_id, session_id)
+            except Exception as e:
+                logger.error(f"Error rehydrating session {session_id}: {e}")
+
+        state = ConversationState(
+            session_id=session_id,
+            advisor_id=advisor_id,
+            memory=memory,
+            agent_executor=self.create_agent(advisor_id),
+        )
 
-    async def chat(self, message: str, advisor_id: str, session_id: str = None) -> dict:
+        if session_id:
+            self.sessions.put(state)
+
+        return state
+
+    async def _fast_path(self, message: str, state: ConversationState, context: ToolContext,
+                         received_at: datetime) -> Optional[dict]:
+        """Answer recognized lookup questions from customer data without running the agent"""
+        # Classify before loading the index so open-ended questions cost nothing extra
+        if self.router.classify(message) is None:
+            return None
+
+        match = self.router.route(message, await context.get_index())
+        if match is None:
+            return None
+
+        answer = match.answer
+        if settings.INTENT_FAST_PATH_LLM_PHRASING and match.customer is not None:
+            try:
+                async with self.scheduler.slot(state.advisor_id):
+                    phrased = await self.llm.ainvoke(PHRASING_TEMPLATE.format(facts=answer, question=message))
+                answer = phrased.strip() or answer
+            except Exception as e:
+                logger.warning(f"Falling back to unphrased fast-path answer: {e}")
+
+        # Keep the turn in memory so follow-up questions to the agent have context
+        self._remember(state, message, answer, received_at)
+
+        return {"response": answer, "chart_data": None, "intent": match.intent}
+
+    def _remember(self, state: ConversationState, message: str, answer: str, received_at: datetime):
+        """Save a turn to the session's memory; every answer path calls this exactly once"""
+        state.memory.save_turn(message, answer, received_at)
+        self.sessions.update_size(state)
+
+    def forget_turn(self, session_id: str, received_at: datetime):
+        """Drop a turn from a pooled session's memory, e.g. when it could not be stored"""
+        state = self.sessions.get(session_id)
+        if state is not None and state.memory.forget_turn(received_at):
+            self.sessions.update_size(state)
+
+    async def _run_agent(self, message: str, advisor_id: str, session_id: str = None,
+                         callbacks: list = None, received_at: datetime = None) -> dict:
+        """
+        Answer a message from the intent fast path or the response cache, or run
+        the session's agent
+
+        The agent run, including every LLM call in it, must finish within
+        LLM_REQUEST_TIMEOUT_SECONDS of the request starting. If it times out,
+        fails, or the Ollama circuit is open, the answer comes from customer
+        data alone (see _degraded). received_at is when the user message
+        arrived, the timestamp it is stored with.
+        """
+        deadline = time.monotonic() + settings.LLM_REQUEST_TIMEOUT_SECONDS
+        received_at = received_at or datetime.utcnow()
+
+        # Get the session's agent and memory
+        state = await self.get_conversation(advisor_id, session_id)
+
+        # One primary key read; keys the cached customer index, book context and answers
+        data_version = None
+        if self.indexes is not None or self.cache is not None or self.book_contexts is not None:
+            data_version = await self._data_version(advisor_id)
+
+        # Fresh tool context for this request, shared by the fast path and the agent's tools
+        context = ToolContext(advisor_id, data_version, self.indexes)
+        token = _tool_context.set(context)
+        # Route this session's LLM calls to the same Ollama server
+        session_token = llm_session_id.set(session_id)
+        try:
+            if settings.INTENT_FAST_PATH_ENABLED:
+                response = await self._fast_path(message, state, context, received_at)
+                if response is not None:
+                    CHAT_ANSWERS.inc("fast_path")
+                    return response
+
+            if data_version is not None and self.cache is not None and ResponseCache.is_cacheable(message):
+                response = await self.cache.get(advisor_id, data_version, message)
+                if response is not None:
+                    self._remember(state, message, response["response"], received_at)
+                    CHAT_ANSWERS.inc("cache")
+                    return {**response, "cached": True}
+
+            # Fail fast rather than queue for an LLM that is down
+            if self.breaker.is_open:
+                return await self._degraded(message, state, context, received_at, "Ollama circuit is open")
+
+            book_context = await self._book_context(advisor_id, data_version, context)
+
+            # Invoke the agent once the scheduler admits it
+            if settings.METRICS_ENABLED:
+                callbacks = [*(callbacks or []), agent_metrics]
+            config = {"callbacks": callbacks} if callbacks else None
+            deadline_token = llm_deadline.set(deadline)
+            try:
+                async with self.scheduler.slot(advisor_id):
+                    result = await asyncio.wait_for(
+                        state.agent_executor.ainvoke({
+                            "input": message,
+                            "book_context": book_context,
+                            "chat_history": state.memory.buffer_as_messages,
+                        }, config=config),
+                        deadline - time.monotonic(),
+                    )
+            except SchedulerRejectedError:
+                raise
+            except asyncio.TimeoutError:
+                return await self._degraded(message, state, context, received_at, "request deadline exceeded")
+            except Exception as e:
+                return await self._degraded(message, state, context, received_at, f"agent failed: {e}")
+            finally:
+                llm_deadline.reset(deadline_token)
+
+            # Iteration or time limit reached (per-call timeouts end up here too)
+            if result.get("output", "").startswith(AGENT_STOPPED_PREFIX):
+                return await self._degraded(message, state, context, received_at, "agent stopped early",
+                                            unanswered=INCOMPLETE_MESSAGE)
+
+            response = {
+                "response": result.get("output", "I'm sorry, I couldn't process that request."),
+                "chart_data": None,  # TODO: Implement chart generation logic
+            }
+            self._remember(state, message, response["response"], received_at)
+        finally:
+            _tool_context.reset(token)
+            llm_session_id.reset(session_token)
+            self._schedule_summary(state)
+        CHAT_ANSWERS.inc("agent")
+
+        # Only complete answers are worth repeating
+        if data_version is not None and self.cache is not None and ResponseCache.is_cacheable(message) \
+                and "output" in result and not result["output"].startswith(AGENT_STOPPED_PREFIX):
+            await self.cache.set(advisor_id, data_version, message, response)
+
+        return response
+
+    def _schedule_summary(self, state: ConversationState):
+        """Start folding turns that left the history window into the summary, off the request path"""
+        if not state.session_id or (state.summary_task is not None and not state.summary_task.done()):
+            return
+        if state.memory.turns_outside_window() < settings.MEMORY_SUMMARY_MIN_TURNS:
+            return
+        state.summary_task = asyncio.create_task(self._summarize(state))
+
+    async def _summarize(self, state: ConversationState):
+        """Fold turns outside the window into the session's rolling summary and persist it"""
+        memory = state.memory
+        turns = memory.turns_outside_window()
+        summary = None
+
+        if settings.MEMORY_SUMMARY_ENABLED:
+            folded = memory.chat_memory.messages[:2 * turns]
+            prompt = SUMMARY_TEMPLATE.format(
+                summary=memory.summary or "(none)",
+                turns=get_buffer_string(folded, human_prefix="Advisor", ai_prefix="Assistant"),
+            )
+            try:
+                async with self.scheduler.slot(SUMMARY_QUEUE):
+                    summary = (await self.llm.ainvoke(prompt)).strip()
+            except Exception as e:
+                # The window still bounds the prompt; try again after a later turn
+                logger.warning(f"Could not summarize session {state.session_id}: {e}")
+                return
+            if not summary:
+                return
+
+        memory.fold(turns, summary)
+        self.sessions.update_size(state)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await async_chat_service.update_session_summary(
+                    db, state.session_id, memory.summary, memory.summary_until
+                )
+        except Exception as e:
+            logger.error(f"Error saving summary for session {state.session_id}: {e}")
+
+    async def _degraded(self, message: str, state: ConversationState, context: ToolContext,
+                        received_at: datetime, reason: str, unanswered: str = DEGRADED_MESSAGE) -> dict:
+        """
+        Answer from customer data alone when the agent cannot
+
+        Questions naming one customer get the closest deterministic answer;
+        anything else gets the unanswered message. Only an index already in
+        memory is used, so this path never waits on a cold load of the book.
+        """
+        logger.warning(f"Answering without the agent: {reason}")
+        CHAT_ANSWERS.inc("degraded")
+        index = context.peek_index()
+        match = self.router.fallback(message, index) if index is not None else None
+        answer = match.answer if match is not None else unanswered
+
+        self._remember(state, message, answer, received_at)
+
+        return {"response": answer, "chart_data": None, "degraded": True}
+
+    async def _data_version(self, advisor_id: str) -> Optional[str]:
+        """Current data version stamp for an advisor, or None if it cannot be read"""
+        try:
+            async with AsyncSessionLocal() as db:
+                return await async_customer_service.get_data_version(db, advisor_id)
+        except Exception as e:
+            logger.warning(f"Skipping response cache and cached book context and customer index: {e}")
+            return None
+
+    async def _book_context(self, advisor_id: str, data_version: Optional[str], context: ToolContext) -> str:
+        """Compact summary of the advisor's book for the prompt, rebuilt when their data changes"""
+        if self.book_contexts is None:
+            return NO_BOOK_CONTEXT
+
+        if data_version is not None:
+            text = self.book_contexts.get(advisor_id, data_version)
+            if text is not None:
+                return text
+
+        try:
+            text = build_book_context(await context.get_index(), settings.BOOK_CONTEXT_MAX_CHARS)
+        except Exception as e:
+            logger.warning(f"Could not build book context for {advisor_id}: {e}")
+            return NO_BOOK_CONTEXT
+
+        if data_version is not None:
+            self.book_contexts.put(advisor_id, data_version, text)
+        return text
+
+    async def chat(self, message: str, advisor_id: str, session_id: str = None,
+                   received_at: datetime = None) -> dict:
         """
         Process a chat message and return response
 
@@ -138,25 +862,19 @@ Question: {input}
             message: User's message
             advisor_id: Advisor's ID
             session_id: Optional session ID for context
+            received_at: When the message arrived, as stored with it (default: now)
 
         Returns:
             dict with response and optional chart_data
+
+        Raises:
+            SchedulerRejectedError: if the LLM is too busy to take the request
         """
         try:
-            # Create or get agent
-            if not self.agent_executor:
-                self.create_agent(advisor_id)
-
-            # Invoke the agent
-            result = await self.agent_executor.ainvoke({"input": message})
-
-            response = {
-                "response": result.get("output", "I'm sorry, I couldn't process that request."),
-                "chart_data": None,  # TODO: Implement chart generation logic
-            }
-
-            return response
+            return await self._run_agent(message, advisor_id, session_id, received_at=received_at)
 
+        except SchedulerRejectedError:
+            raise
         except Exception as e:
             logger.error(f"Error in chat processing: {e}")
             return {
@@ -164,12 +882,58 @@ Question: {input}
                 "chart_data": None
             }
 
-    def reset_memory(self):
-        """Reset conversation memory"""
-        if self.memory:
-            self.memory.clear()
+    async def stream_chat(self, message: str, advisor_id: str, session_id: str = None,
+                          received_at: datetime = None) -> AsyncIterator[dict]:
+        """
+        Process a chat message, yielding events as they are produced
+
+        Yields dicts with an "event" key: "token" for each LLM token,
+        "agent_action"/"tool_start"/"tool_end" for agent steps, and a final
+        "done" event carrying the same response and chart_data as chat().
+        Raises SchedulerRejectedError if the LLM is too busy to take the request.
+        """
+        handler = StreamingEventHandler()
+        task = asyncio.create_task(
+            self._run_agent(message, advisor_id, session_id, callbacks=[handler], received_at=received_at)
+        )
+
+        try:
+            while not task.done():
+                next_event = asyncio.ensure_future(handler.queue.get())
+                done, _ = await asyncio.wait({next_event, task}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event in done:
+                    yield next_event.result()
+                else:
+                    next_event.cancel()
+
+            # Flush events emitted just before the agent finished
+            while not handler.queue.empty():
+                yield handler.queue.get_nowait()
+
+            try:
+                response = task.result()
+            except SchedulerRejectedError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in chat processing: {e}")
+                response = {
+                    "response": "I apologize, but I encountered an error processing your request. Please try again.",
+                    "chart_data": None
+                }
+
+            yield {"event": "done", **response}
+
+        finally:
+            if not task.done():
+                task.cancel()
+
+    def reset_memory(self, session_id: str = None):
+        """Reset conversation memory for one session, or for all sessions"""
+        if session_id:
+            self.sessions.discard(session_id)
+        else:
+            self.sessions.clear()
 
 
 # Global instance
 langchain_service = LangChainService()
-
@@ -0,0 +1,172 @@
+from app.core.metrics import STAGE_QUEUE_WAIT, record_stage
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest run in the moving average of run times
+SERVICE_TIME_ALPHA = 0.2
+
+
+class SchedulerRejectedError(Exception):
+    """Raised when a request cannot be admitted to the LLM in time"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM generations
+
+    At most max_in_flight agent runs talk to Ollama at once; the rest wait in
+    per-advisor queues that are served round-robin, so one advisor's burst
+    cannot starve everyone else. Requests are rejected up front, rather than
+    queued, when the queue is full (503), when the advisor already has
+    max_queue_per_advisor requests waiting (429), or when the expected wait
+    exceeds max_wait_ms (503). A queued request that is still waiting after
+    max_wait_ms is rejected as well.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue_size: int, max_queue_per_advisor: int,
+                 max_wait_ms: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue_size = max_queue_size
+        self.max_queue_per_advisor = max_queue_per_advisor
+        self.max_wait = max_wait_ms / 1000
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        self._in_flight = 0
+        self._service_time: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def estimated_wait(self) -> float:
+        """Expected seconds until a newly queued request starts"""
+        if self._service_time is None:
+            return 0.0
+        return (self._queued + 1) / self.max_in_flight * self._service_time
+
+    @asynccontextmanager
+    async def slot(self, advisor_id: str) -> AsyncIterator[None]:
+        """Hold one generation slot for the duration of the block"""
+        await self.acquire(advisor_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    async def acquire(self, advisor_id: str):
+        """Wait for a generation slot, or raise SchedulerRejectedError"""
+        if self._in_flight < self.max_in_flight and not self._queued:
+            self._in_flight += 1
+            self._record_wait(0.0)
+            return
+
+        if self._queued >= self.max_queue_size:
+            self._reject("LLM queue is full", 503)
+        queue = self._queues.get(advisor_id)
+        if queue is not None and len(queue) >= self.max_queue_per_advisor:
+            self._reject("Too many pending requests for this advisor", 429)
+        if self.estimated_wait() > self.max_wait:
+            self._reject("LLM is overloaded, expected wait exceeds the limit", 503)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(advisor_id, deque()).append(future)
+        self._queued += 1
+        enqueued = time.monotonic()
+
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._remove(advisor_id, future)
+            self.timeouts += 1
+            self._reject("Timed out waiting for the LLM", 503)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away
+                self.release()
+            else:
+                self._remove(advisor_id, future)
+            raise
+
+        self._record_wait(time.monotonic() - enqueued)
+
+    def release(self, service_seconds: Optional[float] = None):
+        """Return a slot and hand it to the next advisor in turn"""
+        self._in_flight -= 1
+        if service_seconds is not None:
+            if self._service_time is None:
+                self._service_time = service_seconds
+            else:
+                self._service_time += SERVICE_TIME_ALPHA * (service_seconds - self._service_time)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._in_flight < self.max_in_flight and self._queues:
+            advisor_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._queued -= 1
+            if queue:
+                # Round-robin: the advisor goes to the back of the line
+                self._queues.move_to_end(advisor_id)
+            else:
+                del self._queues[advisor_id]
+
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    def _remove(self, advisor_id: str, future: asyncio.Future):
+        queue = self._queues.get(advisor_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            del self._queues[advisor_id]
+
+    def _record_wait(self, seconds: float):
+        self.admitted += 1
+        self.wait_seconds_total += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        record_stage(STAGE_QUEUE_WAIT, seconds)
+
+    def _reject(self, message: str, status_code: int):
+        self.rejected += 1
+        retry_after = max(1, math.ceil(self.estimated_wait()))
+        logger.warning(f"{message} (in flight {self._in_flight}, queued {self._queued})")
+        raise SchedulerRejectedError(message, status_code, retry_after)
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, wait times and admission counters"""
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "queued_advisors": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "avg_run_seconds": self._service_time or 0.0,
+        }
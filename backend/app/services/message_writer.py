@@ -0,0 +1,236 @@
+from sqlalchemy import insert
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.chat import MESSAGE_STATUS_COMPLETE, ChatMessage
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_SYNC = "sync"
+DURABILITY_ASYNC = "async"
+
+# Queue entry: rows written in the same transaction and, in sync mode, a
+# future resolved on commit
+_Entry = Tuple[List[dict], Optional[asyncio.Future]]
+
+
+class MessageQueueFullError(Exception):
+    """Raised when the write-behind queue stays full past the enqueue timeout"""
+
+
+class MessageWriter:
+    """
+    Write-behind queue that batches chat message inserts into shared transactions
+
+    Messages from all sessions are queued and written by a single background
+    task, one transaction per batch. A batch is flushed when it reaches
+    batch_size rows or flush_interval_ms after its first row, whichever comes
+    first. In "sync" durability mode callers wait for the commit of the batch
+    holding their message; in "async" mode they return as soon as it is queued.
+    Messages queued together by add_messages are always written in the same
+    transaction.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int,
+        batch_size: int,
+        max_queue_size: int,
+        enqueue_timeout_ms: int,
+        durability: str = DURABILITY_SYNC,
+    ):
+        if durability not in (DURABILITY_SYNC, DURABILITY_ASYNC):
+            raise ValueError(f"Unknown message write durability mode: {durability}")
+
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.durability = durability
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Write-through tasks started by add_message_nowait outside the app lifecycle
+        self._pending: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def queue_depth(self) -> int:
+        """Number of queued writes (messages queued together count once) waiting to be written"""
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Start the background flush task"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Message writer started (durability={self.durability}, "
+            f"batch_size={self.batch_size}, flush_interval={self.flush_interval * 1000:.0f}ms)"
+        )
+
+    async def stop(self):
+        """Flush all queued messages and stop the background task"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("Message writer stopped")
+
+    async def add_message(
+        self,
+        session_id: int,
+        role: str,
+        content: str,
+        chart_data: dict = None,
+        timestamp: datetime = None,
+        status: str = MESSAGE_STATUS_COMPLETE
+    ):
+        """Queue a message for insertion, applying backpressure when the queue is full"""
+        await self.add_messages([{
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "chart_data": chart_data,
+            "timestamp": timestamp,
+            "status": status,
+        }])
+
+    async def add_messages(self, messages: List[dict]):
+        """
+        Queue messages to be written in one transaction, e.g. both halves of a
+        turn, waiting for a single commit in sync mode
+
+        Each dict holds add_message's keyword arguments.
+        """
+        rows = [self._make_row(**message) for message in messages]
+
+        # Outside the app lifecycle (scripts, tests) write straight through
+        if not self.running:
+            await self._insert_rows(rows)
+            return
+
+        future = None
+        if self.durability == DURABILITY_SYNC:
+            future = asyncio.get_running_loop().create_future()
+
+        try:
+            await asyncio.wait_for(self._queue.put((rows, future)), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise MessageQueueFullError(
+                f"Message write queue is full ({self.max_queue_size} pending messages)"
+            )
+
+        if future is not None:
+            await future
+
+    def add_message_nowait(
+        self,
+        session_id: int,
+        role: str,
+        content: str,
+        chart_data: dict = None,
+        timestamp: datetime = None,
+        status: str = MESSAGE_STATUS_COMPLETE
+    ) -> bool:
+        """
+        Queue a message without waiting, e.g. from a request that is being cancelled
+
+        Returns False if the queue is full and the message was dropped.
+        """
+        row = self._make_row(session_id, role, content, chart_data, timestamp, status)
+
+        if not self.running:
+            task = asyncio.get_running_loop().create_task(self._insert_rows([row]))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            return True
+
+        try:
+            self._queue.put_nowait(([row], None))
+        except asyncio.QueueFull:
+            logger.warning(f"Dropping {role} message for session {session_id}, write queue full")
+            return False
+        return True
+
+    @staticmethod
+    def _make_row(session_id: int, role: str, content: str, chart_data: Optional[dict] = None,
+                  timestamp: Optional[datetime] = None, status: str = MESSAGE_STATUS_COMPLETE) -> dict:
+        return {
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "chart_data": chart_data,
+            "status": status,
+            "timestamp": timestamp or datetime.utcnow(),
+        }
+
+    async def _run(self):
+        """Collect queued messages into batches and write them until stopped"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            entry = await self._queue.get()
+            if entry is None:
+                return
+
+            batch: List[_Entry] = [entry]
+            rows = len(entry[0])
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+
+            while rows < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        entry = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                    else:
+                        entry = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+                rows += len(entry[0])
+
+            await self._write_batch(batch)
+            if stopping:
+                return
+
+    async def _insert_rows(self, rows: List[dict]):
+        """Insert rows into chat_messages in one transaction"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(ChatMessage), rows)
+            await db.commit()
+
+    async def _write_batch(self, batch: List[_Entry]):
+        """Write a batch and notify callers waiting on its commit"""
+        try:
+            await self._insert_rows([row for rows, _ in batch for row in rows])
+        except Exception as e:
+            # In async mode nobody is waiting, so a failed batch is only logged
+            logger.error(f"Error writing {len(batch)} chat messages: {e}")
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+
+message_writer = MessageWriter(
+    flush_interval_ms=settings.MESSAGE_WRITE_FLUSH_INTERVAL_MS,
+    batch_size=settings.MESSAGE_WRITE_BATCH_SIZE,
+    max_queue_size=settings.MESSAGE_WRITE_QUEUE_SIZE,
+    enqueue_timeout_ms=settings.MESSAGE_WRITE_ENQUEUE_TIMEOUT_MS,
+    durability=settings.MESSAGE_WRITE_DURABILITY,
+)
@@ -0,0 +1,298 @@
+from langchain_community.llms import Ollama
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.outputs import LLMResult
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import aiohttp
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+ROUTING_LEAST_OUTSTANDING = "least_outstanding"
+ROUTING_WEIGHTED = "weighted"
+
+# Weight of the latest call in the latency and error-rate moving averages
+EWMA_ALPHA = 0.2
+
+# Calls a backend must have served before its error rate can eject it
+MIN_CALLS_FOR_ERROR_RATE = 10
+
+# Longest ejection after repeated failures, in multiples of the base period
+MAX_EJECTION_MULTIPLIER = 8
+
+# Servers tried for one call when connections are refused
+MAX_CONNECT_ATTEMPTS = 2
+
+# Number of session -> backend assignments remembered for affinity
+MAX_AFFINITY_SESSIONS = 10000
+
+# Chat session the current LLM call belongs to, used for backend affinity
+llm_session_id: ContextVar[Optional[str]] = ContextVar("llm_session_id", default=None)
+
+# time.monotonic() by which the current request's LLM calls must finish
+llm_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+class OllamaBackend:
+    """One Ollama server and its passively tracked health"""
+
+    def __init__(self, url: str, weight: float, llm: Ollama):
+        self.url = url
+        self.weight = weight
+        self.llm = llm
+        self.outstanding = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "status": "ejected" if self.ejected else "healthy",
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "latency_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+        }
+
+
+class OllamaPool:
+    """
+    Routes LLM calls across several Ollama servers
+
+    Backends are picked by fewest outstanding requests (relative to weight) or
+    at random in proportion to weight. Calls from the same chat session stick
+    to one backend while it is healthy, so its KV cache stays warm. A backend
+    is ejected for eject_seconds after too many consecutive failures or a high
+    error rate; once the period ends it is tried again, and each repeated
+    ejection doubles the period.
+    """
+
+    def __init__(
+        self,
+        backends: List[OllamaBackend],
+        routing: str = ROUTING_LEAST_OUTSTANDING,
+        session_affinity: bool = True,
+        eject_consecutive_failures: int = 3,
+        eject_error_rate: float = 0.5,
+        eject_seconds: float = 30,
+    ):
+        if not backends:
+            raise ValueError("At least one Ollama backend is required")
+        if routing not in (ROUTING_LEAST_OUTSTANDING, ROUTING_WEIGHTED):
+            raise ValueError(f"Unknown Ollama routing strategy: {routing}")
+
+        self.backends = backends
+        self.routing = routing
+        self.session_affinity = session_affinity
+        self.eject_consecutive_failures = eject_consecutive_failures
+        self.eject_error_rate = eject_error_rate
+        self.eject_seconds = eject_seconds
+        self._affinity: "OrderedDict[str, OllamaBackend]" = OrderedDict()
+
+    def choose(self, session_id: Optional[str] = None, exclude: List[OllamaBackend] = ()) -> OllamaBackend:
+        """Pick the backend for the next call, avoiding those in exclude if possible"""
+        if self.session_affinity and session_id:
+            backend = self._affinity.get(session_id)
+            if backend is not None and not backend.ejected and backend not in exclude:
+                self._affinity.move_to_end(session_id)
+                return backend
+
+        candidates = [b for b in self.backends if not b.ejected and b not in exclude]
+        if not candidates:
+            # Everything is ejected: try the one that will be re-admitted first
+            others = [b for b in self.backends if b not in exclude] or self.backends
+            return min(others, key=lambda backend: backend.ejected_until)
+
+        if self.routing == ROUTING_WEIGHTED:
+            backend = random.choices(candidates, weights=[b.weight for b in candidates])[0]
+        else:
+            backend = min(candidates, key=lambda b: (b.outstanding / b.weight, b.latency_ewma or 0.0))
+
+        if self.session_affinity and session_id:
+            self._affinity[session_id] = backend
+            self._affinity.move_to_end(session_id)
+            while len(self._affinity) > MAX_AFFINITY_SESSIONS:
+                self._affinity.popitem(last=False)
+        return backend
+
+    def record(self, backend: OllamaBackend, latency: float, failed: bool):
+        """Update a backend's health after a call, ejecting it if unhealthy"""
+        backend.calls += 1
+        backend.error_rate += EWMA_ALPHA * ((1.0 if failed else 0.0) - backend.error_rate)
+
+        if not failed:
+            backend.consecutive_failures = 0
+            if backend.latency_ewma is None:
+                backend.latency_ewma = latency
+            else:
+                backend.latency_ewma += EWMA_ALPHA * (latency - backend.latency_ewma)
+            return
+
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.ejected:
+            return
+        if backend.consecutive_failures >= self.eject_consecutive_failures or (
+            backend.calls >= MIN_CALLS_FOR_ERROR_RATE and backend.error_rate > self.eject_error_rate
+        ):
+            self._eject(backend)
+
+    def _eject(self, backend: OllamaBackend):
+        multiplier = min(2 ** backend.ejections, MAX_EJECTION_MULTIPLIER)
+        backend.ejections += 1
+        backend.ejected_until = time.monotonic() + self.eject_seconds * multiplier
+        # Give a re-admitted backend a clean slate so one failure does not eject it again at once
+        backend.consecutive_failures = 0
+        backend.error_rate = 0.0
+        logger.warning(f"Ejecting Ollama backend {backend.url} for {self.eject_seconds * multiplier:.0f}s")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Health and load of every backend"""
+        return [backend.stats() for backend in self.backends]
+
+
+class PooledOllama(BaseLLM):
+    """
+    LLM that sends each generation to a backend chosen by an OllamaPool
+
+    A call that cannot connect is retried once on another server. Each call
+    is limited to call_timeout seconds and to the request deadline in
+    llm_deadline, and is refused while the optional circuit breaker is open.
+
+    Failover and the timeouts apply to async calls, which is how the service
+    calls the LLM. Sync calls check the breaker and the request deadline
+    before they start, but run on one server and are not interrupted.
+    """
+
+    pool: Any
+    breaker: Any = None
+    call_timeout: Optional[float] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-pool"
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        timeout = self._call_timeout()
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("Request deadline exceeded before the LLM call")
+
+        if self.breaker is not None:
+            self.breaker.before_call()
+        backend = self.pool.choose(llm_session_id.get())
+        backend.outstanding += 1
+        started = time.monotonic()
+        failed = True
+        try:
+            result = backend.llm._generate(prompts, stop=stop, run_manager=run_manager, **kwargs)
+            failed = False
+            return result
+        finally:
+            backend.outstanding -= 1
+            self.pool.record(backend, time.monotonic() - started, failed)
+            if self.breaker is not None and failed:
+                self.breaker.record_failure()
+            elif self.breaker is not None:
+                self.breaker.record_success()
+
+    def _call_timeout(self) -> Optional[float]:
+        """Seconds the next call may take: the per-call limit, capped by the request deadline"""
+        timeout = self.call_timeout
+        deadline = llm_deadline.get()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        timeout = self._call_timeout()
+        if timeout is not None and timeout <= 0:
+            raise asyncio.TimeoutError("Request deadline exceeded before the LLM call")
+
+        if self.breaker is not None:
+            self.breaker.before_call()
+        try:
+            result = await self._agenerate_with_failover(prompts, stop, run_manager, timeout, **kwargs)
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.record_cancelled()
+            raise
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return result
+
+    async def _agenerate_with_failover(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]],
+        run_manager: Optional[AsyncCallbackManagerForLLMRun],
+        timeout: Optional[float],
+        **kwargs: Any,
+    ) -> LLMResult:
+        tried: List[OllamaBackend] = []
+        while True:
+            backend = self.pool.choose(llm_session_id.get(), exclude=tried)
+            tried.append(backend)
+            backend.outstanding += 1
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    backend.llm._agenerate(prompts, stop=stop, run_manager=run_manager, **kwargs),
+                    timeout,
+                )
+            except asyncio.CancelledError:
+                # The caller went away; says nothing about the backend's health
+                backend.outstanding -= 1
+                raise
+            except aiohttp.ClientConnectorError:
+                backend.outstanding -= 1
+                self.pool.record(backend, time.monotonic() - started, failed=True)
+                # The connection was never made, so nothing was generated or
+                # streamed yet and another server can take the call. Errors
+                # after connecting (e.g. ServerDisconnectedError mid-stream)
+                # are not retried: tokens may already have reached the client
+                if len(tried) < min(len(self.pool.backends), MAX_CONNECT_ATTEMPTS):
+                    continue
+                raise
+            except Exception:
+                backend.outstanding -= 1
+                self.pool.record(backend, time.monotonic() - started, failed=True)
+                raise
+            backend.outstanding -= 1
+            self.pool.record(backend, time.monotonic() - started, failed=False)
+            return result
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Answers to these depend on earlier turns, so they are never cached
+CONTEXT_DEPENDENT = re.compile(
+    r"\b(he|she|him|her|his|hers|they|them|their|theirs|it|its|that|this|those|these|"
+    r"above|previous|earlier|again|same)\b"
+)
+
+# Delete expired SQLite entries once every this many writes
+SQLITE_PRUNE_EVERY = 500
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(prompt.lower().split()).rstrip("?!. ")
+
+
+class ResponseCache:
+    """
+    Cache of LLM answers keyed by advisor, customer data version and prompt
+
+    The data version changes whenever the advisor's customers or accounts
+    change, so stale answers are never served after a write. Entries live in a
+    size-bounded in-memory LRU, optionally backed by a SQLite file shared by
+    all workers on the host.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._sqlite: Optional[sqlite3.Connection] = None
+        self._sqlite_lock = threading.Lock()
+        self._sqlite_writes = 0
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def is_cacheable(prompt: str) -> bool:
+        """Whether an answer to prompt is independent of the conversation so far"""
+        return not CONTEXT_DEPENDENT.search(prompt.lower())
+
+    @staticmethod
+    def make_key(advisor_id: str, data_version: str, prompt: str) -> str:
+        raw = "\0".join((advisor_id, data_version, normalize_prompt(prompt)))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, advisor_id: str, data_version: str, prompt: str) -> Optional[dict]:
+        """Return a cached response, or None on a miss"""
+        key = self.make_key(advisor_id, data_version, prompt)
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, response = entry
+            if now - stored_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return dict(response)
+            del self._entries[key]
+
+        if self.sqlite_path:
+            try:
+                row = await asyncio.to_thread(self._sqlite_get, key, now - self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Response cache SQLite read failed: {e}")
+                row = None
+            if row is not None:
+                stored_at, response = row
+                self._remember(key, stored_at, response)
+                self.sqlite_hits += 1
+                return dict(response)
+
+        self.misses += 1
+        return None
+
+    async def set(self, advisor_id: str, data_version: str, prompt: str, response: dict):
+        """Store a response for later identical questions"""
+        key = self.make_key(advisor_id, data_version, prompt)
+        stored_at = time.time()
+        self._remember(key, stored_at, response)
+        self.stores += 1
+
+        if self.sqlite_path:
+            try:
+                await asyncio.to_thread(self._sqlite_set, key, advisor_id, stored_at, response)
+            except Exception as e:
+                logger.warning(f"Response cache SQLite write failed: {e}")
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Cache size and hit/miss counters"""
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def _remember(self, key: str, stored_at: float, response: dict):
+        self._entries[key] = (stored_at, dict(response))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._sqlite is None:
+            self._sqlite = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._sqlite.execute("PRAGMA journal_mode=WAL")
+            self._sqlite.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, advisor_id TEXT, stored_at REAL, response TEXT)"
+            )
+        return self._sqlite
+
+    def _sqlite_get(self, key: str, min_stored_at: float) -> Optional[tuple]:
+        with self._sqlite_lock:
+            row = self._connection().execute(
+                "SELECT stored_at, response FROM response_cache WHERE key = ? AND stored_at >= ?",
+                (key, min_stored_at),
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _sqlite_set(self, key: str, advisor_id: str, stored_at: float, response: dict):
+        with self._sqlite_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, advisor_id, stored_at, response) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, advisor_id, stored_at, json.dumps(response)),
+                )
+                self._sqlite_writes += 1
+                if self._sqlite_writes % SQLITE_PRUNE_EVERY == 0:
+                    connection.execute(
+                        "DELETE FROM response_cache WHERE stored_at < ?",
+                        (stored_at - self.ttl_seconds,),
+                    )
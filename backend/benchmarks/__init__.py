@@ -0,0 +1 @@
+"""Offline benchmark suite: a stand-in Ollama server and a load driver for the API"""
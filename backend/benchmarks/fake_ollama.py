@@ -0,0 +1,186 @@
+"""
+Stand-in Ollama HTTP server for offline benchmarks
+
+Implements the parts of the Ollama API the backend uses (/api/generate
+streaming and /api/tags) with configurable time-to-first-token, token rate
+and failure injection. Replies follow the ReAct format the agent expects:
+either a tool call or a final answer.
+
+Run standalone:
+    python -m benchmarks.fake_ollama --port 11435 --ttft-ms 200 --tokens-per-second 40
+"""
+from aiohttp import web
+from datetime import datetime
+from typing import List, Optional
+import argparse
+import asyncio
+import json
+import random
+import time
+
+FINAL_ANSWER = (
+    "Thought: I can answer this from the information available.\n"
+    "Final Answer: Based on the account data, the customer's balances are in line with "
+    "their stated allocation targets and no action is needed at this time."
+)
+TOOL_CALL = "Thought: I need to look up the customer.\nAction: AccountBalance\nAction Input: {name}"
+
+
+class FakeOllamaStats:
+    """Counters for generated requests, used for per-stage breakdowns"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.failures = 0
+        self.tokens = 0
+        self.generation_seconds = 0.0
+        self.ttft_seconds: List[float] = []
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "tokens": self.tokens,
+            "generation_seconds": self.generation_seconds,
+            "ttft_seconds": list(self.ttft_seconds),
+        }
+
+
+class FakeOllama:
+    """aiohttp application emulating an Ollama server"""
+
+    def __init__(
+        self,
+        model: str = "mistral",
+        ttft_ms: float = 200,
+        tokens_per_second: float = 40,
+        failure_rate: float = 0.0,
+        tool_call_rate: float = 0.0,
+        customer_name: str = "John Smith",
+        seed: int = 42,
+    ):
+        self.model = model
+        self.ttft = ttft_ms / 1000
+        self.token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        self.failure_rate = failure_rate
+        self.tool_call_rate = tool_call_rate
+        self.customer_name = customer_name
+        self.rng = random.Random(seed)
+        self.stats = FakeOllamaStats()
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_post("/api/generate/", self.generate)
+        app.router.add_get("/api/tags", self.tags)
+        app.router.add_get("/api/ps", self.ps)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 11435):
+        """Serve the fake Ollama API in the current event loop"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _reply_for(self, prompt: str) -> str:
+        """Pick a ReAct-formatted reply for a prompt"""
+        # After a tool observation the agent expects a final answer
+        question = prompt.rsplit("Question:", 1)[-1]
+        if "Observation:" in question or self.rng.random() >= self.tool_call_rate:
+            return FINAL_ANSWER
+        return TOOL_CALL.format(name=self.customer_name)
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        """Split text into word-sized tokens, keeping whitespace attached"""
+        tokens, current = [], ""
+        for char in text:
+            current += char
+            if char in " \n":
+                tokens.append(current)
+                current = ""
+        if current:
+            tokens.append(current)
+        return tokens
+
+    async def tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": f"{self.model}:latest", "model": f"{self.model}:latest"}]})
+
+    async def ps(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": f"{self.model}:latest", "model": f"{self.model}:latest"}]})
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        started = time.perf_counter()
+        self.stats.requests += 1
+
+        if self.rng.random() < self.failure_rate:
+            self.stats.failures += 1
+            await asyncio.sleep(self.ttft)
+            return web.json_response({"error": "injected failure"}, status=500)
+
+        text = self._reply_for(payload.get("prompt") or "")
+        for stop in (payload.get("options") or {}).get("stop") or []:
+            if stop and stop in text:
+                text = text[:text.index(stop)]
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        await asyncio.sleep(self.ttft)
+
+        model = payload.get("model", self.model)
+        try:
+            for i, token in enumerate(self._tokens(text)):
+                if i == 0:
+                    self.stats.ttft_seconds.append(time.perf_counter() - started)
+                elif self.token_interval:
+                    await asyncio.sleep(self.token_interval)
+                self.stats.tokens += 1
+                chunk = {"model": model, "created_at": datetime.utcnow().isoformat() + "Z",
+                         "response": token, "done": False}
+                await response.write((json.dumps(chunk) + "\n").encode())
+
+            final = {"model": model, "created_at": datetime.utcnow().isoformat() + "Z", "response": "",
+                     "done": True, "eval_count": self.stats.tokens}
+            await response.write((json.dumps(final) + "\n").encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client timed out or was cancelled mid-generation
+            pass
+
+        self.stats.generation_seconds += time.perf_counter() - started
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stand-in Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="mistral")
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        model=args.model,
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        tool_call_rate=args.tool_call_rate,
+    )
+    web.run_app(server.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
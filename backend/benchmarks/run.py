@@ -0,0 +1,354 @@
+"""
+Benchmark the API offline against the stand-in Ollama server
+
+Seeds a throwaway SQLite database with seed_db.py --bulk, starts the fake
+Ollama server and the API (uvicorn, in a subprocess), then drives each
+scenario at each concurrency level. Results are written as JSON so runs can
+be compared across commits.
+
+Usage:
+    python -m benchmarks.run --concurrency 1 8 32 --requests 200 --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json --threshold 0.10
+"""
+from benchmarks.fake_ollama import FakeOllama
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import httpx
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ["chat", "chat_stream", "customers", "customer_detail", "charts"]
+QUESTIONS = [
+    "What is the total balance for John Smith?",
+    "Show me the portfolio allocation for Mary Johnson",
+    "Summarize my top clients",
+    "Which of my customers have retirement accounts?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values_ms, 50), 2),
+        "p95": round(percentile(values_ms, 95), 2),
+        "p99": round(percentile(values_ms, 99), 2),
+        "mean": round(statistics.fmean(values_ms), 2) if values_ms else 0.0,
+        "max": round(max(values_ms), 2) if values_ms else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Workload:
+    """Builds the HTTP requests for each scenario"""
+
+    def __init__(self, advisors: int, customers_per_advisor: int):
+        self.advisors = advisors
+        self.customers_per_advisor = customers_per_advisor
+
+    def advisor(self, i: int) -> str:
+        return f"advisor-{i % self.advisors + 1}"
+
+    def customer_id(self, i: int) -> int:
+        # Bulk seeding into an empty database numbers customers advisor by advisor
+        advisor_index = i % self.advisors
+        return advisor_index * self.customers_per_advisor + (i // self.advisors) % self.customers_per_advisor + 1
+
+    async def chat(self, client: httpx.AsyncClient, i: int, state: dict) -> dict:
+        response = await client.post("/api/v1/chat/message", json={
+            "message": QUESTIONS[i % len(QUESTIONS)],
+            "advisor_id": state.setdefault("advisor_id", self.advisor(i)),
+            "session_id": state.get("session_id"),
+        })
+        response.raise_for_status()
+        state["session_id"] = response.json()["session_id"]
+        return {}
+
+    async def chat_stream(self, client: httpx.AsyncClient, i: int, state: dict) -> dict:
+        started = time.perf_counter()
+        ttfb = None
+        async with client.stream("POST", "/api/v1/chat/message/stream", json={
+            "message": QUESTIONS[i % len(QUESTIONS)],
+            "advisor_id": state.setdefault("advisor_id", self.advisor(i)),
+            "session_id": state.get("session_id"),
+        }) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if ttfb is None and line.startswith("event: token"):
+                    ttfb = (time.perf_counter() - started) * 1000
+                if line.startswith("data: ") and '"session_id"' in line:
+                    state["session_id"] = json.loads(line[6:]).get("session_id", state.get("session_id"))
+                if line.startswith("event: error"):
+                    raise RuntimeError("stream reported an error")
+        return {"ttfb_ms": ttfb} if ttfb is not None else {}
+
+    async def customers(self, client: httpx.AsyncClient, i: int, state: dict) -> dict:
+        response = await client.get("/api/v1/customers", params={"advisor_id": self.advisor(i)})
+        response.raise_for_status()
+        return {}
+
+    async def customer_detail(self, client: httpx.AsyncClient, i: int, state: dict) -> dict:
+        response = await client.get(
+            f"/api/v1/customers/{self.customer_id(i)}", params={"advisor_id": self.advisor(i)}
+        )
+        response.raise_for_status()
+        return {}
+
+    async def charts(self, client: httpx.AsyncClient, i: int, state: dict) -> dict:
+        data_type = ("accounts", "portfolio", "performance")[i % 3]
+        response = await client.post("/api/v1/charts/generate", json={
+            "data_type": data_type,
+            "filters": {"advisor_id": self.advisor(i)},
+            "chart_type": "line" if data_type == "performance" else "bar",
+        })
+        response.raise_for_status()
+        return {}
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    request: Callable[[httpx.AsyncClient, int, dict], Awaitable[dict]],
+    concurrency: int,
+    total_requests: int,
+    warmup: int,
+    ollama: FakeOllama,
+) -> dict:
+    """Drive one scenario at a fixed concurrency and summarize the results"""
+    for i in range(warmup):
+        try:
+            await request(client, i, {})
+        except Exception:
+            pass
+    ollama.stats.reset()
+
+    latencies: List[float] = []
+    extras: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    counter = iter(range(total_requests))
+
+    async def worker():
+        state: dict = {}
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                extra = await request(client, i, state)
+            except Exception as e:
+                key = type(e).__name__
+                if isinstance(e, httpx.HTTPStatusError):
+                    key = f"HTTP {e.response.status_code}"
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            for key, value in extra.items():
+                extras.setdefault(key, []).append(value)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+        "stages": {key: summarize(values) for key, values in extras.items()},
+    }
+
+    # Split chat latency into time spent in the (fake) LLM and everything else
+    llm = ollama.stats.snapshot()
+    if llm["requests"] and latencies:
+        llm_ms = llm["generation_seconds"] * 1000 / len(latencies)
+        result["stages"]["llm"] = {
+            "calls_per_request": round(llm["requests"] / len(latencies), 2),
+            "ms_per_request": round(llm_ms, 2),
+            "ttft_ms": summarize([value * 1000 for value in llm["ttft_seconds"]]),
+            "failures": llm["failures"],
+        }
+        result["stages"]["app_overhead_ms_per_request"] = round(
+            max(0.0, statistics.fmean(latencies) - llm_ms), 2
+        )
+
+    return result
+
+
+async def wait_until_ready(base_url: str, process: asyncio.subprocess.Process, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.returncode is not None:
+                raise RuntimeError(f"API server exited with status {process.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("API server did not become ready in time")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """List regressions in p95 latency or throughput relative to a baseline run"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results["results"]:
+        base = previous.get((result["scenario"], result["concurrency"]))
+        if not base:
+            continue
+        label = f"{result['scenario']} @ c={result['concurrency']}"
+        old_p95, new_p95 = base["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if old_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append(f"{label}: p95 {old_p95:.1f}ms -> {new_p95:.1f}ms")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{label}: rps {base['rps']:.1f} -> {result['rps']:.1f}")
+    return regressions
+
+
+async def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="stifel-bench-"))
+    ollama_port, api_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret-key"),
+        "DEBUG": "False",
+        "LOG_LEVEL": "WARNING",
+    }
+
+    print(f"Seeding benchmark database in {workdir} ...")
+    subprocess.run(
+        [sys.executable, "seed_db.py", "--bulk",
+         "--advisors", str(args.advisors),
+         "--customers-per-advisor", str(args.customers_per_advisor),
+         "--accounts-per-customer", str(args.accounts_per_customer),
+         "--seed", str(args.seed)],
+        cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+
+    ollama = FakeOllama(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        tool_call_rate=args.tool_call_rate,
+        seed=args.seed,
+    )
+    await ollama.start(port=ollama_port)
+
+    server = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning",
+        cwd=BACKEND_DIR, env=env,
+    )
+
+    base_url = f"http://127.0.0.1:{api_port}"
+    workload = Workload(args.advisors, args.customers_per_advisor)
+    results = []
+    try:
+        await wait_until_ready(base_url, server)
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    result = await run_scenario(
+                        client, scenario, getattr(workload, scenario), concurrency,
+                        args.requests, args.warmup, ollama,
+                    )
+                    latency = result["latency_ms"]
+                    print(f"{scenario:>16} c={concurrency:<4} rps={result['rps']:>8.1f} "
+                          f"p50={latency['p50']:>8.1f}ms p95={latency['p95']:>8.1f}ms "
+                          f"p99={latency['p99']:>8.1f}ms errors={sum(result['errors'].values())}")
+                    results.append(result)
+    finally:
+        server.terminate()
+        await server.wait()
+        await ollama.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout in seconds")
+    parser.add_argument("--advisors", type=int, default=10)
+    parser.add_argument("--customers-per-advisor", type=int, default=500)
+    parser.add_argument("--accounts-per-customer", type=int, default=4)
+    parser.add_argument("--ttft-ms", type=float, default=200, help="Fake Ollama time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40, help="Fake Ollama token rate")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of generations that fail")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0,
+                        help="Fraction of first generations that call a tool")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Run EXPLAIN over the service layer's queries and flag table scans
+
+Usage:
+    python index_advisor.py [--advisor-id advisor-1] [--fail-on-scan]
+
+The service queries behind the API are executed against the configured
+database while their SQL is captured. Each query is then run through
+EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (PostgreSQL). Plans that scan a whole
+table or sort through a temporary structure are flagged. Query planners
+happily scan tiny tables, so run this against a large seeded dataset
+(python seed_db.py --bulk).
+"""
+from sqlalchemy import event, func, select
+from app.database.session import AsyncSessionLocal, async_engine, init_db
+from app.models.balance_history import BalanceSnapshot, advisor_series
+from app.models.chat import ChatMessage, ChatSession
+from app.models.customer import Account, Customer
+from app.services.balance_history import balance_history_service
+from app.services.chat_service import async_chat_service
+from app.services.customer_service import async_customer_service
+from datetime import date, timedelta
+from typing import Awaitable, Callable, List, Tuple
+import argparse
+import asyncio
+import re
+import sys
+
+# Plan lines that indicate a full scan or an unindexed sort
+SQLITE_SCAN = re.compile(r"^SCAN (?!.*\bUSING\b)|USE TEMP B-TREE")
+POSTGRES_SCAN = re.compile(r"Seq Scan|Sort Method: external")
+
+# Below this many rows the planner may legitimately prefer scans
+SMALL_TABLE_ROWS = 10_000
+
+
+async def pick_sample_ids(advisor_id: str = None) -> dict:
+    """Find an advisor, customer and chat session to run the queries with"""
+    async with AsyncSessionLocal() as db:
+        if advisor_id is None:
+            advisor_id = (await db.execute(
+                select(Customer.advisor_id)
+                .group_by(Customer.advisor_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            )).scalar()
+
+        customer_id = (await db.execute(
+            select(Customer.id).filter(Customer.advisor_id == advisor_id).limit(1)
+        )).scalar()
+
+        session = (await db.execute(
+            select(ChatSession.id, ChatSession.session_id, ChatSession.advisor_id)
+            .join(ChatMessage, ChatMessage.session_id == ChatSession.id)
+            .group_by(ChatSession.id)
+            .order_by(func.count().desc())
+            .limit(1)
+        )).first()
+
+    return {
+        "advisor_id": advisor_id or "advisor-1",
+        "customer_id": customer_id or 1,
+        "session_pk": session.id if session else 1,
+        "session_id": session.session_id if session else "",
+        "session_advisor_id": session.advisor_id if session else "",
+    }
+
+
+def service_queries(ids: dict) -> List[Tuple[str, Callable[..., Awaitable]]]:
+    """The service calls whose SQL is checked, with sample arguments"""
+    advisor_id, customer_id = ids["advisor_id"], ids["customer_id"]
+    session_pk = ids["session_pk"]
+
+    async def messages_second_page(db):
+        _, after = await async_chat_service.get_session_messages_page(db, session_pk, 10)
+        if after is not None:
+            await async_chat_service.get_session_messages_page(db, session_pk, 10, after=after)
+
+    return [
+        ("customers page", lambda db: async_customer_service.get_customers_page(db, advisor_id, 100)),
+        ("customers page after cursor",
+         lambda db: async_customer_service.get_customers_page(db, advisor_id, 100, after_id=customer_id)),
+        ("customers with accounts", lambda db: async_customer_service.get_customers_with_accounts(db, advisor_id)),
+        ("customer by id", lambda db: async_customer_service.get_customer_by_id(db, customer_id, advisor_id)),
+        ("customer details", lambda db: async_customer_service.get_customer_details(db, [customer_id], advisor_id)),
+        ("customer accounts", lambda db: async_customer_service.get_customer_accounts(db, customer_id)),
+        ("customer total balance", lambda db: async_customer_service.get_total_balance(db, customer_id)),
+        ("chat session", lambda db: async_chat_service.get_session(db, ids["session_id"], ids["session_advisor_id"])),
+        ("chat messages", lambda db: async_chat_service.get_session_messages(db, session_pk)),
+        ("chat messages page after cursor", messages_second_page),
+        ("book totals", lambda db: async_customer_service.get_book_totals(db, advisor_id)),
+        ("top customer totals", lambda db: async_customer_service.get_top_customer_totals(db, advisor_id, 10)),
+        ("balance history range", lambda db: balance_history_service.read_range(
+            db, [advisor_series(advisor_id)], date.today() - timedelta(days=180), date.today()
+        )),
+    ]
+
+
+async def capture_statements(ids: dict) -> List[Tuple[str, str, tuple]]:
+    """Run each service query and capture the SQL it sends to the database"""
+    captured: List[Tuple[str, str, tuple]] = []
+    current = {"name": None}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            captured.append((current["name"], statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for name, query in service_queries(ids):
+            current["name"] = name
+            async with AsyncSessionLocal() as db:
+                await query(db)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    return captured
+
+
+async def explain(statement: str, parameters: tuple) -> List[str]:
+    """Return the query plan lines for a captured statement"""
+    dialect = async_engine.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    async with async_engine.connect() as conn:
+        result = await conn.exec_driver_sql(prefix + statement, parameters)
+        rows = result.all()
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+async def table_sizes() -> dict:
+    """Row counts of the main tables"""
+    async with AsyncSessionLocal() as db:
+        return {
+            model.__tablename__: (await db.execute(select(func.count()).select_from(model))).scalar()
+            for model in (Customer, Account, ChatSession, ChatMessage, BalanceSnapshot)
+        }
+
+
+async def run(advisor_id: str = None) -> int:
+    """Explain every service query and print a report; returns the number of flagged plans"""
+    init_db()
+
+    sizes = await table_sizes()
+    print("Table sizes: " + ", ".join(f"{name}={count:,}" for name, count in sizes.items()))
+    if min(sizes.values()) < SMALL_TABLE_ROWS:
+        print(f"⚠️  Some tables have fewer than {SMALL_TABLE_ROWS:,} rows; "
+              "plans may not reflect production behaviour (seed one with: python seed_db.py --bulk)")
+
+    ids = await pick_sample_ids(advisor_id)
+    pattern = SQLITE_SCAN if async_engine.dialect.name == "sqlite" else POSTGRES_SCAN
+
+    flagged = 0
+    for name, statement, parameters in await capture_statements(ids):
+        plan = await explain(statement, parameters)
+        scans = [line for line in plan if pattern.search(line)]
+        status = "SCAN" if scans else "ok"
+        flagged += bool(scans)
+
+        print(f"\n[{status}] {name}")
+        print("    " + " ".join(statement.split()))
+        for line in plan:
+            marker = "!!" if line in scans else "  "
+            print(f"  {marker} {line}")
+
+    print(f"\n{flagged} flagged quer{'y' if flagged == 1 else 'ies'}")
+    await async_engine.dispose()
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--advisor-id", help="Advisor to run queries for (default: the one with most customers)")
+    parser.add_argument("--fail-on-scan", action="store_true", help="Exit with status 1 if any plan is flagged")
+    args = parser.parse_args()
+
+    flagged = asyncio.run(run(args.advisor_id))
+    if args.fail_on_scan and flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
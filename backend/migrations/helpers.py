@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+def needs_column(table: str, column: str) -> bool:
+    """
+    Whether an existing table lacks a column
+
+    init_db creates missing tables with every current column, so a migration
+    only adds a column to tables created before it was introduced.
+    """
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return False
+    return column not in {existing["name"] for existing in inspector.get_columns(table)}
+
+
+def has_column(table: str, column: str) -> bool:
+    """Whether a table exists and has a column"""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return False
+    return column in {existing["name"] for existing in inspector.get_columns(table)}
@@ -0,0 +1,24 @@
+"""Add chat_messages.status
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import needs_column
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if needs_column("chat_messages", "status"):
+        op.add_column("chat_messages", sa.Column("status", sa.String(), server_default="complete"))
+
+
+def downgrade():
+    with op.batch_alter_table("chat_messages") as batch_op:
+        batch_op.drop_column("status")
@@ -0,0 +1,27 @@
+"""Add chat_sessions.summary and summary_turns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:05:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import needs_column
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if needs_column("chat_sessions", "summary"):
+        op.add_column("chat_sessions", sa.Column("summary", sa.Text(), nullable=True))
+    if needs_column("chat_sessions", "summary_turns"):
+        op.add_column("chat_sessions", sa.Column("summary_turns", sa.Integer(), server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("chat_sessions") as batch_op:
+        batch_op.drop_column("summary_turns")
+        batch_op.drop_column("summary")
@@ -0,0 +1,63 @@
+"""Replace chat_sessions.summary_turns with summary_until
+
+The summary now records the timestamp of the last user message it covers
+instead of a count of turns, which drifted from the stored messages when a
+turn was remembered but never persisted. Existing counts are converted by
+walking each summarized session's completed turns.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:30:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import has_column, needs_column
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _summary_until(bind, session_pk: int, turns: int):
+    """Timestamp of the user message of the turns-th completed turn, as rehydration used to count them"""
+    messages = bind.execute(
+        sa.text("SELECT role, status, timestamp FROM chat_messages WHERE session_id = :id ORDER BY timestamp"),
+        {"id": session_pk},
+    ).all()
+    pending, completed = None, 0
+    for role, status, timestamp in messages:
+        if status == "abandoned":
+            continue
+        if role == "user":
+            pending = timestamp
+        elif role == "assistant" and pending is not None:
+            completed += 1
+            if completed == turns:
+                return pending
+            pending = None
+    return pending
+
+
+def upgrade():
+    if needs_column("chat_sessions", "summary_until"):
+        op.add_column("chat_sessions", sa.Column("summary_until", sa.DateTime(), nullable=True))
+    if not has_column("chat_sessions", "summary_turns"):
+        return
+
+    bind = op.get_bind()
+    sessions = bind.execute(sa.text("SELECT id, summary_turns FROM chat_sessions WHERE summary_turns > 0")).all()
+    for session_pk, turns in sessions:
+        bind.execute(
+            sa.text("UPDATE chat_sessions SET summary_until = :until WHERE id = :id"),
+            {"until": _summary_until(bind, session_pk, turns), "id": session_pk},
+        )
+    with op.batch_alter_table("chat_sessions") as batch_op:
+        batch_op.drop_column("summary_turns")
+
+
+def downgrade():
+    # Turn counts are not recovered; summarized sessions replay their full history
+    with op.batch_alter_table("chat_sessions") as batch_op:
+        batch_op.add_column(sa.Column("summary_turns", sa.Integer(), server_default="0"))
+        batch_op.drop_column("summary_until")
@@ -0,0 +1,33 @@
+"""
+Rebuild the advisor and customer book aggregates from the accounts table
+
+Usage:
+    python rebuild_book_aggregates.py [--advisor-id advisor-1]
+
+The aggregates behind /customers/summary, the BookSummary agent tool and the
+unfiltered account and top customer charts are kept current by ORM events on
+Account. Writes that bypass the ORM (bulk Core inserts, raw SQL, restores)
+are not seen by those events; run this afterwards, or whenever the totals
+look wrong, to recompute them in one transaction.
+"""
+from app.database.session import engine, init_db
+from app.models.book_aggregates import rebuild_book_aggregates
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--advisor-id", help="Only rebuild this advisor's aggregates (default: all advisors)")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        by_type, customers = rebuild_book_aggregates(conn, args.advisor_id)
+    print(f"✅ Rebuilt {by_type:,} advisor account type totals and {customers:,} customer totals "
+          f"({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
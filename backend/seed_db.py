@@ -1,9 +1,64 @@
 """
 Seed the database with sample data for testing
+
+Usage:
+    python seed_db.py            # 5 sample customers for advisor-1
+    python seed_db.py --bulk     # large deterministic dataset for performance work
+
+Bulk mode example (1M accounts):
+    python seed_db.py --bulk --advisors 250 --customers-per-advisor 1000 --accounts-per-customer 4
+
+Add --history-days 365 to also generate a year of daily balance history
+ending at today's balances (see snapshot_balances.py for the real job).
 """
-from app.database.session import SessionLocal, init_db
+from sqlalchemy import func, insert, select, text
+from app.database.session import SessionLocal, engine, init_db
+from app.models.balance_history import BalanceSnapshot, account_series, advisor_series, customer_series
+from app.models.book_aggregates import rebuild_book_aggregates
+from app.models.chat import ChatSession, ChatMessage
 from app.models.customer import Customer, Account
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List
+import argparse
+import numpy as np
 import random
+import time
+import uuid
+
+# Account types and balance ranges for bulk mode
+ACCOUNT_TYPES = ["checking", "savings", "investment", "retirement"]
+BALANCE_RANGES = {
+    "checking": (1000, 25000),
+    "savings": (10000, 75000),
+    "investment": (50000, 500000),
+    "retirement": (100000, 1000000),
+}
+# Mean and standard deviation of daily returns per account type, for generated history
+DAILY_RETURNS = {
+    "checking": (0.0, 0.01),
+    "savings": (0.0001, 0.0005),
+    "investment": (0.0003, 0.012),
+    "retirement": (0.0002, 0.008),
+}
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
+    "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+    "Thomas", "Sarah", "Charles", "Karen", "Daniel", "Nancy", "Matthew", "Lisa",
+    "Anthony", "Betty", "Mark", "Margaret", "Steven", "Emily",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+    "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson",
+    "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+]
+SAMPLE_QUESTIONS = [
+    "What is {name}'s total balance?",
+    "Show me the accounts for {name}",
+    "What is the portfolio allocation for {name}?",
+    "Summarize my top clients",
+]
 
 
 def seed_database():
@@ -102,6 +157,229 @@ def seed_database():
         db.close()
 
 
+def _batched(rows: Iterable[dict], batch_size: int) -> Iterator[List[dict]]:
+    """Group rows into lists of at most batch_size"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _next_id(conn, model) -> int:
+    """First free primary key for a table, so bulk rows can carry explicit IDs"""
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _bulk_insert(conn, model, rows: Iterable[dict], batch_size: int) -> int:
+    """Insert rows with one executemany per batch; returns the row count"""
+    count = 0
+    for batch in _batched(rows, batch_size):
+        conn.execute(insert(model), batch)
+        count += len(batch)
+    return count
+
+
+def _history_rows(conn, first_customer_id: int, days: int, seed: int) -> Iterator[dict]:
+    """
+    Daily balance snapshots for the accounts of customers from first_customer_id
+
+    A random walk backwards from each account's current balance, so the last
+    day matches the accounts table; customer and advisor totals are summed
+    per day like the snapshot job does.
+    """
+    rows = conn.execute(
+        select(Account.id, Account.customer_id, Customer.advisor_id, Account.account_type, Account.balance)
+        .join(Customer, Account.customer_id == Customer.id)
+        .filter(Customer.id >= first_customer_id)
+        .order_by(Account.id)
+    ).all()
+    if not rows:
+        return
+    np_rng = np.random.default_rng(seed)
+    customer_ids, customer_index = np.unique([row[1] for row in rows], return_inverse=True)
+    groups = sorted({(row[2], row[3]) for row in rows})
+    group_positions = {group: i for i, group in enumerate(groups)}
+    group_index = np.array([group_positions[(row[2], row[3])] for row in rows])
+    advisors = sorted({row[2] for row in rows})
+    advisor_positions = {advisor_id: i for i, advisor_id in enumerate(advisors)}
+    group_advisor = np.array([advisor_positions[advisor_id] for advisor_id, _ in groups])
+    mean = np.array([DAILY_RETURNS.get(row[3], (0.0, 0.0))[0] for row in rows])
+    std = np.array([DAILY_RETURNS.get(row[3], (0.0, 0.0))[1] for row in rows])
+    balances = np.array([row[4] or 0.0 for row in rows])
+
+    today = datetime.utcnow().date()
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        for row, balance in zip(rows, balances):
+            yield {"series": account_series(row[0]), "day": day, "balance": round(float(balance), 2)}
+        for customer_id, total in zip(customer_ids, np.bincount(customer_index, balances, len(customer_ids))):
+            yield {"series": customer_series(int(customer_id)), "day": day, "balance": round(float(total), 2)}
+        by_group = np.bincount(group_index, balances, len(groups))
+        for (advisor_id, account_type), total in zip(groups, by_group):
+            yield {"series": advisor_series(advisor_id, account_type), "day": day, "balance": round(float(total), 2)}
+        for advisor_id, total in zip(advisors, np.bincount(group_advisor, by_group, len(advisors))):
+            yield {"series": advisor_series(advisor_id), "day": day, "balance": round(float(total), 2)}
+        # Step back to the previous day's closing balances
+        balances = np.maximum(balances / (1 + np_rng.normal(mean, std)), 0.0)
+
+
+def seed_bulk(
+    advisors: int,
+    customers_per_advisor: int,
+    accounts_per_customer: int,
+    sessions_per_advisor: int,
+    messages_per_session: int,
+    seed: int = 42,
+    batch_size: int = 10000,
+    history_days: int = 0,
+):
+    """
+    Generate a large, deterministic dataset for performance measurements
+
+    Rows are appended to any existing data using explicit primary keys and
+    inserted with batched executemany calls in a single transaction. The same
+    arguments and seed always produce the same names, balances and messages.
+    """
+    init_db()
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Bulk load speedups; durability is irrelevant for generated data
+            conn.execute(text("PRAGMA synchronous = OFF"))
+
+        first_customer_id = _next_id(conn, Customer)
+        first_session_id = _next_id(conn, ChatSession)
+        advisor_ids = [f"advisor-{n}" for n in range(1, advisors + 1)]
+        customer_names = {}
+
+        def customer_rows() -> Iterator[dict]:
+            customer_id = first_customer_id
+            for advisor_id in advisor_ids:
+                for _ in range(customers_per_advisor):
+                    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                    customer_names.setdefault(advisor_id, []).append(name)
+                    yield {
+                        "id": customer_id,
+                        "advisor_id": advisor_id,
+                        "name": name,
+                        "email": f"customer{customer_id}@example.com",
+                        "phone": f"555-{customer_id % 10000:04d}",
+                        "account_status": "active" if rng.random() < 0.95 else "inactive",
+                        "created_at": now - timedelta(days=rng.randint(0, 3650)),
+                        "updated_at": now,
+                    }
+                    customer_id += 1
+
+        customers = _bulk_insert(conn, Customer, customer_rows(), batch_size)
+        print(f"   Created {customers:,} customers ({time.perf_counter() - started:.1f}s)")
+
+        def account_rows() -> Iterator[dict]:
+            for customer_id in range(first_customer_id, first_customer_id + customers):
+                for i in range(accounts_per_customer):
+                    account_type = ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)]
+                    low, high = BALANCE_RANGES[account_type]
+                    yield {
+                        "customer_id": customer_id,
+                        "account_number": f"ACC-{customer_id:07d}-{i + 1:02d}",
+                        "account_type": account_type,
+                        "balance": round(rng.uniform(low, high), 2),
+                        "created_at": now - timedelta(days=rng.randint(0, 3650)),
+                        "updated_at": now,
+                    }
+
+        accounts = _bulk_insert(conn, Account, account_rows(), batch_size)
+        print(f"   Created {accounts:,} accounts ({time.perf_counter() - started:.1f}s)")
+
+        # Core inserts bypass the ORM events that keep the book aggregates current
+        rebuild_book_aggregates(conn)
+        print(f"   Rebuilt book aggregates ({time.perf_counter() - started:.1f}s)")
+
+        if history_days > 0:
+            snapshots = _bulk_insert(
+                conn, BalanceSnapshot, _history_rows(conn, first_customer_id, history_days, seed), batch_size
+            )
+            print(f"   Created {snapshots:,} balance snapshots over {history_days} days "
+                  f"({time.perf_counter() - started:.1f}s)")
+
+        session_plan = [
+            (first_session_id + n * sessions_per_advisor + i, advisor_id)
+            for n, advisor_id in enumerate(advisor_ids)
+            for i in range(sessions_per_advisor)
+        ]
+
+        def session_rows() -> Iterator[dict]:
+            for session_id, advisor_id in session_plan:
+                yield {
+                    "id": session_id,
+                    "session_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                    "advisor_id": advisor_id,
+                    "started_at": now - timedelta(days=rng.randint(0, 365)),
+                }
+
+        sessions = _bulk_insert(conn, ChatSession, session_rows(), batch_size)
+
+        def message_rows() -> Iterator[dict]:
+            for session_id, advisor_id in session_plan:
+                timestamp = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+                names = customer_names.get(advisor_id) or ["my clients"]
+                for i in range(messages_per_session):
+                    name = rng.choice(names)
+                    if i % 2 == 0:
+                        role, content = "user", rng.choice(SAMPLE_QUESTIONS).format(name=name)
+                    else:
+                        role, content = "assistant", f"Here is the information you asked for about {name}."
+                    timestamp += timedelta(seconds=rng.randint(5, 120))
+                    yield {
+                        "session_id": session_id,
+                        "role": role,
+                        "content": content,
+                        "chart_data": None,
+                        "timestamp": timestamp,
+                    }
+
+        messages = _bulk_insert(conn, ChatMessage, message_rows(), batch_size)
+        print(f"   Created {sessions:,} chat sessions and {messages:,} messages "
+              f"({time.perf_counter() - started:.1f}s)")
+
+    print(f"✅ Bulk dataset generated in {time.perf_counter() - started:.1f}s (seed={seed})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with sample data")
+    parser.add_argument("--bulk", action="store_true", help="Generate a large deterministic dataset")
+    parser.add_argument("--advisors", type=int, default=10)
+    parser.add_argument("--customers-per-advisor", type=int, default=1000)
+    parser.add_argument("--accounts-per-customer", type=int, default=4)
+    parser.add_argument("--sessions-per-advisor", type=int, default=20)
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible data")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per executemany batch")
+    parser.add_argument("--history-days", type=int, default=0, help="Days of balance history to generate")
+    args = parser.parse_args()
+
+    if not args.bulk:
+        seed_database()
+        return
+
+    seed_bulk(
+        advisors=args.advisors,
+        customers_per_advisor=args.customers_per_advisor,
+        accounts_per_customer=args.accounts_per_customer,
+        sessions_per_advisor=args.sessions_per_advisor,
+        messages_per_session=args.messages_per_session,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        history_days=args.history_days,
+    )
+
+
 if __name__ == "__main__":
-    seed_database()
+    main()
 
@@ -0,0 +1,45 @@
+"""
+Record today's closing balances in the balance history
+
+Usage:
+    python snapshot_balances.py [--day 2024-01-31] [--batch-size 5000]
+
+Appends one balance_snapshots row per account, customer and advisor (overall
+and per account type) for the day. Run it once a day after balances settle,
+e.g. from cron:
+
+    55 23 * * *  cd /path/to/backend && python snapshot_balances.py
+
+Re-running for a day replaces that day's rows. Performance charts and the
+agent's BalanceHistory tool read these series.
+"""
+from app.database.session import AsyncSessionLocal, async_engine, init_db
+from app.services.balance_history import SNAPSHOT_BATCH_SIZE, balance_history_service
+from datetime import date
+import argparse
+import asyncio
+import time
+
+
+async def run(day: date = None, batch_size: int = SNAPSHOT_BATCH_SIZE) -> int:
+    """Snapshot every balance for day; returns the number of rows written"""
+    init_db()
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        written = await balance_history_service.snapshot(db, day, batch_size)
+    await async_engine.dispose()
+    print(f"✅ Recorded {written:,} balance snapshots ({time.perf_counter() - started:.1f}s)")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--day", type=date.fromisoformat, help="Day to record the balances as (default: today, UTC)")
+    parser.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.day, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
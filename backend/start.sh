@@ -35,6 +35,11 @@ else
     fi
 fi
 
+# Apply schema migrations
+echo ""
+echo "${BLUE}🗄️  Applying database migrations...${NC}"
+alembic upgrade head || exit 1
+
 # Start the server
 echo ""
 echo "${BLUE}🌐 Starting FastAPI server...${NC}"